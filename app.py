@@ -1,40 +1,179 @@
+import base64
+import binascii
+import os
 import sqlite3
-from flask import Flask, render_template, request, url_for, flash, redirect
+from flask import Flask, render_template, request, url_for, flash, redirect, jsonify, session
 from werkzeug.exceptions import abort
 
+import db
+import storage
+import template_cache
+from page_cache import PageCache, bump_generations, get_generation
+from static_assets import StaticAssets
+
 
 def get_db_connection():
-    conn = sqlite3.connect('database.db')
+    # check_same_thread is off because pooled connections move between the
+    # worker's threads; the pool guarantees one user at a time.
+    conn = sqlite3.connect(app.config['DATABASE'],
+                           check_same_thread=False,
+                           cached_statements=app.config['DB_STATEMENT_CACHE'])
     conn.row_factory = sqlite3.Row
     return conn
 
 
 def get_post(post_id):
-    conn = get_db_connection()
-    post = conn.execute('SELECT * FROM posts WHERE id = ?',
-                        (post_id,)).fetchone()
-    conn.close()
+    post = storage.load_post(db.get_db(), post_id)
     if post is None:
         abort(404)
     return post
 
 
+def encode_cursor(row):
+    raw = '{}|{}'.format(row['created'], row['id']).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Turn an opaque page cursor back into a ``(created, id)`` key."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created, _, post_id = base64.urlsafe_b64decode(padded).decode('utf-8').rpartition('|')
+        return created, int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        abort(400)
+
+
+def get_page_size():
+    limit = request.args.get('limit', type=int) or app.config['POSTS_PER_PAGE']
+    return max(1, min(limit, app.config['MAX_POSTS_PER_PAGE']))
+
+
+def list_posts(limit, before=None, after=None):
+    """Return one page of list columns ordered newest first.
+
+    Pages are addressed by the ``(created, id)`` key of their neighbour
+    rather than an OFFSET, so each query is an index range scan of
+    ``limit + 1`` rows however deep the reader has paged.
+    """
+    conn = db.get_db()
+    if after is not None:
+        rows = conn.execute('SELECT id, created, title FROM posts'
+                            ' WHERE (created, id) > (?, ?)'
+                            ' ORDER BY created, id LIMIT ?',
+                            (*after, limit + 1)).fetchall()
+        has_prev = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_next = True
+    else:
+        if before is not None:
+            rows = conn.execute('SELECT id, created, title FROM posts'
+                                ' WHERE (created, id) < (?, ?)'
+                                ' ORDER BY created DESC, id DESC LIMIT ?',
+                                (*before, limit + 1)).fetchall()
+        else:
+            rows = conn.execute('SELECT id, created, title FROM posts'
+                                ' ORDER BY created DESC, id DESC LIMIT ?',
+                                (limit + 1,)).fetchall()
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        has_prev = before is not None
+    next_cursor = encode_cursor(rows[-1]) if rows and has_next else None
+    prev_cursor = encode_cursor(rows[0]) if rows and has_prev else None
+    return rows, next_cursor, prev_cursor
+
+
+def fts_query(text):
+    """Quote each search term so user input is never parsed as FTS5 syntax.
+
+    NULs are dropped (FTS5 would end the string there); text with no terms
+    left becomes ``""``, which matches nothing.
+    """
+    terms = text.replace('\x00', '').split()
+    return ' '.join('"{}"'.format(term.replace('"', '""')) for term in terms) or '""'
+
+
+def search_posts(text, limit, page):
+    """Return one page of posts matching ``text``, best bm25 match first.
+
+    Title hits weigh more than body hits.
+    """
+    conn = db.get_db()
+    return conn.execute('SELECT posts.id, posts.created, posts.title'
+                        ' FROM posts_fts JOIN posts ON posts.id = posts_fts.rowid'
+                        ' WHERE posts_fts MATCH ?'
+                        ' ORDER BY bm25(posts_fts, 10.0, 1.0) LIMIT ? OFFSET ?',
+                        (fts_query(text), limit + 1, (page - 1) * limit)).fetchall()
+
+
+def cached_page(key, generation_name, render):
+    """Serve ``render()`` from the page cache while its generation holds.
+
+    Pages are cached only for visitors with no pending flash messages, since
+    those are rendered into the layout and belong to a single session.
+    """
+    if session.get('_flashes'):
+        return render()
+    generation = get_generation(db.get_db(), generation_name)
+    html = page_cache.get(key, generation)
+    if html is None:
+        html = render()
+        page_cache.set(key, generation, html)
+    return html
+
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your secret key'
+app.config['DATABASE'] = os.getenv('DATABASE_FILE', 'database.db')
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', '5'))
+app.config['POSTS_PER_PAGE'] = int(os.getenv('POSTS_PER_PAGE', '20'))
+app.config['MAX_POSTS_PER_PAGE'] = 100
+app.config['BODY_COMPRESS_THRESHOLD'] = int(
+    os.getenv('BODY_COMPRESS_THRESHOLD', str(storage.DEFAULT_COMPRESS_THRESHOLD)))
+app.config['PAGE_CACHE_SIZE'] = int(os.getenv('PAGE_CACHE_SIZE', '512'))
+page_cache = PageCache(app.config['PAGE_CACHE_SIZE'])
+# Templates come from the image's precompiled build when it is current.
+template_cache.init_app(app)
+# Static files are served fingerprinted and immutable from the image's build.
+StaticAssets(app)
+# Resolve get_db_connection at call time so it can be swapped out (tests do).
+db.init_app(app, lambda: get_db_connection())
 
 
 @app.route('/')
 def index():
-    conn = get_db_connection()
-    posts = conn.execute('SELECT * FROM posts').fetchall()
-    conn.close()
-    return render_template('index.html', posts=posts)
+    before = request.args.get('before')
+    after = request.args.get('after')
+    limit = get_page_size()
+
+    def render():
+        posts, next_cursor, prev_cursor = list_posts(
+            limit,
+            before=decode_cursor(before) if before else None,
+            after=decode_cursor(after) if after else None,
+        )
+        return render_template('index.html', posts=posts, limit=limit,
+                               next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+    return cached_page(('index', before, after, limit), 'index', render)
 
 
 @app.route('/<int:post_id>')
 def post(post_id):
-    post = get_post(post_id)
-    return render_template('post.html', post=post)
+    def render():
+        return render_template('post.html', post=get_post(post_id))
+
+    return cached_page(('post', post_id), 'post:{}'.format(post_id), render)
+
+
+@app.route('/search')
+def search():
+    q = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    limit = get_page_size()
+    posts = search_posts(q, limit, page) if q else []
+    return render_template('search.html', q=q, posts=posts[:limit], page=page,
+                           limit=limit, has_next=len(posts) > limit)
 
 
 @app.route('/create', methods=('GET', 'POST'))
@@ -46,11 +185,11 @@ def create():
         if not title:
             flash('Title is required!')
         else:
-            conn = get_db_connection()
-            conn.execute('INSERT INTO posts (title, content) VALUES (?, ?)',
-                         (title, content))
+            conn = db.get_db()
+            storage.insert_post(conn, title, content,
+                                app.config['BODY_COMPRESS_THRESHOLD'])
+            bump_generations(conn, 'index')
             conn.commit()
-            conn.close()
             return redirect(url_for('index'))
 
     return render_template('create.html')
@@ -58,8 +197,6 @@ def create():
 
 @app.route('/<int:id>/edit', methods=('GET', 'POST'))
 def edit(id):
-    post = get_post(id)
-
     if request.method == 'POST':
         title = request.form['title']
         content = request.form['content']
@@ -67,23 +204,34 @@ def edit(id):
         if not title:
             flash('Title is required!')
         else:
-            conn = get_db_connection()
-            conn.execute('UPDATE posts SET title = ?, content = ?'
-                         ' WHERE id = ?',
-                         (title, content, id))
+            conn = db.get_db()
+            if storage.update_post(conn, id, title, content,
+                                   app.config['BODY_COMPRESS_THRESHOLD']) is None:
+                abort(404)
+            bump_generations(conn, 'index', 'post:{}'.format(id))
             conn.commit()
-            conn.close()
             return redirect(url_for('index'))
 
-    return render_template('edit.html', post=post)
+    return render_template('edit.html', post=get_post(id))
 
 
 @app.route('/<int:id>/delete', methods=('POST',))
 def delete(id):
-    post = get_post(id)
-    conn = get_db_connection()
-    conn.execute('DELETE FROM posts WHERE id = ?', (id,))
+    conn = db.get_db()
+    post = storage.delete_post(conn, id)
+    if post is None:
+        abort(404)
+    bump_generations(conn, 'index', 'post:{}'.format(id))
     conn.commit()
-    conn.close()
     flash('"{}" was successfully deleted!'.format(post['title']))
     return redirect(url_for('index'))
+
+
+@app.route('/metrics/db-pool')
+def db_pool_stats():
+    return jsonify(db.get_pool().stats())
+
+
+@app.route('/metrics/page-cache')
+def page_cache_stats():
+    return jsonify(page_cache.stats())
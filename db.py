@@ -0,0 +1,185 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from flask import current_app, g
+
+# PRAGMAs applied once to every new connection before it enters the pool.
+DEFAULT_BUSY_TIMEOUT_MS = 5000
+DEFAULT_CACHE_SIZE_KB = 8192
+DEFAULT_STATEMENT_CACHE = 128
+
+
+class PoolTimeout(RuntimeError):
+    """Raised when no pooled connection became available in time."""
+
+
+def tune_connection(conn, busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS,
+                    cache_size_kb=DEFAULT_CACHE_SIZE_KB):
+    """Apply the per-connection settings we want for a multi-worker server.
+
+    WAL lets readers proceed while a writer commits, ``synchronous=NORMAL``
+    drops the fsync on every commit (WAL is still durable across app crashes),
+    and ``busy_timeout`` makes concurrent writers wait instead of failing with
+    "database is locked". A negative ``cache_size`` is expressed in KiB.
+    """
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout={:d}'.format(int(busy_timeout_ms)))
+    conn.execute('PRAGMA cache_size={:d}'.format(-int(cache_size_kb)))
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+
+class ConnectionPool:
+    """A bounded pool of SQLite connections shared by the worker's threads.
+
+    ``factory`` opens a new raw connection; the pool tunes it once and then
+    hands it out repeatedly, so connect cost, schema parsing and the
+    prepared-statement cache are paid once per connection instead of once
+    per request. At most ``max_size`` connections exist at a time; callers
+    wait up to ``timeout`` seconds for one to be released.
+    """
+
+    def __init__(self, factory, max_size=5, timeout=10.0,
+                 busy_timeout_ms=DEFAULT_BUSY_TIMEOUT_MS,
+                 cache_size_kb=DEFAULT_CACHE_SIZE_KB):
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+
+    def _open(self):
+        conn = self.factory()
+        return tune_connection(conn, self.busy_timeout_ms, self.cache_size_kb)
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            with self._lock:
+                self._hits += 1
+            return conn
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+                self._misses += 1
+        if can_create:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(
+                'no database connection available after {}s'.format(self.timeout))
+        waited = time.perf_counter() - started
+        with self._lock:
+            self._waits += 1
+            self._wait_time += waited
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """Close a connection that should not be reused (e.g. after an error)."""
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'open': self._created,
+                'idle': self._idle.qsize(),
+                'hits': self._hits,
+                'misses': self._misses,
+                'waits': self._waits,
+                'wait_time_total': round(self._wait_time, 6),
+                'wait_time_avg': round(self._wait_time / self._waits, 6) if self._waits else 0.0,
+                'timeouts': self._timeouts,
+            }
+
+
+def get_pool(app=None):
+    """Return the app's connection pool, creating it on first use."""
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get('sqlite_pool')
+    if pool is None:
+        pool = ConnectionPool(
+            app.config['DB_CONNECTION_FACTORY'],
+            max_size=app.config['DB_POOL_SIZE'],
+            timeout=app.config['DB_POOL_TIMEOUT'],
+            busy_timeout_ms=app.config['DB_BUSY_TIMEOUT_MS'],
+            cache_size_kb=app.config['DB_CACHE_SIZE_KB'],
+        )
+        app.extensions['sqlite_pool'] = pool
+    return pool
+
+
+def get_db():
+    """Return the connection bound to the current app context.
+
+    Every call within one request shares a single pooled connection; it goes
+    back to the pool when the app context is torn down.
+    """
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    conn = g.pop('db', None)
+    if conn is None:
+        return
+    pool = get_pool()
+    if isinstance(exc, sqlite3.DatabaseError):
+        pool.discard(conn)
+    else:
+        pool.release(conn)
+
+
+def init_app(app, factory):
+    """Wire the pool into ``app``. ``factory`` opens one raw connection."""
+    app.config.setdefault('DB_POOL_SIZE', 5)
+    app.config.setdefault('DB_POOL_TIMEOUT', 10.0)
+    app.config.setdefault('DB_BUSY_TIMEOUT_MS', DEFAULT_BUSY_TIMEOUT_MS)
+    app.config.setdefault('DB_CACHE_SIZE_KB', DEFAULT_CACHE_SIZE_KB)
+    app.config.setdefault('DB_STATEMENT_CACHE', DEFAULT_STATEMENT_CACHE)
+    app.config['DB_CONNECTION_FACTORY'] = factory
+    app.teardown_appcontext(close_db)
@@ -1,6 +1,8 @@
+import argparse
 import os
 import sqlite3
-import sys
+
+import storage
 
 
 def find_schema_file(provided_path=None):
@@ -30,6 +32,100 @@ def default_db_path(schema_path=None):
     return os.path.join(os.getcwd(), 'database.db')
 
 
+# Same definitions as schema.sql, idempotent so they can be applied to an
+# existing database without touching its posts.
+POST_BODIES_SQL = """
+CREATE TABLE IF NOT EXISTS post_bodies (
+    post_id INTEGER PRIMARY KEY REFERENCES posts (id) ON DELETE CASCADE,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    body BLOB NOT NULL
+)
+"""
+SEARCH_INDEX_SQL = "CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(title, content, content='')"
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    # Manage transactions explicitly so DDL and data moves commit together.
+    conn.isolation_level = None
+    return conn
+
+
+def has_inline_content(conn):
+    return any(col['name'] == 'content' for col in conn.execute('PRAGMA table_info(posts)'))
+
+
+def reindex_posts(conn):
+    """Refill the contentless search index from decompressed post bodies."""
+    conn.execute("INSERT INTO posts_fts (posts_fts) VALUES ('delete-all')")
+    rows = conn.execute('SELECT posts.id, posts.title, post_bodies.compressed, post_bodies.body'
+                        ' FROM posts LEFT JOIN post_bodies ON post_bodies.post_id = posts.id')
+    conn.executemany('INSERT INTO posts_fts (rowid, title, content) VALUES (?, ?, ?)',
+                     ((row['id'], row['title'], storage.unpack_body(row['compressed'], row['body']))
+                      for row in rows.fetchall()))
+
+
+def rebuild_search_index(schema_file=None, db_file=None):
+    """Create the full-text index if missing and rebuild it from posts."""
+    schema_path = find_schema_file(schema_file or os.getenv('SCHEMA_FILE'))
+    db_path = db_file or os.getenv('DATABASE_FILE') or default_db_path(schema_path)
+
+    print(f"Rebuilding search index in: {db_path}")
+
+    conn = connect(db_path)
+    if has_inline_content(conn):
+        conn.close()
+        raise SystemExit("posts still stores content inline; run with --migrate-post-bodies first.")
+    conn.execute('BEGIN')
+    conn.execute(SEARCH_INDEX_SQL)
+    reindex_posts(conn)
+    conn.execute('COMMIT')
+    conn.close()
+    print("Search index rebuilt successfully.")
+
+
+def migrate_post_bodies(schema_file=None, db_file=None,
+                        threshold=storage.DEFAULT_COMPRESS_THRESHOLD):
+    """Move inline posts.content into (compressed) post_bodies rows.
+
+    Upgrades a database created from an older schema.sql in place: bodies
+    are copied out of row, the content column is dropped, the search index
+    is recreated in its contentless form and the file is vacuumed so the
+    freed pages are returned to the filesystem.
+    """
+    schema_path = find_schema_file(schema_file or os.getenv('SCHEMA_FILE'))
+    db_path = db_file or os.getenv('DATABASE_FILE') or default_db_path(schema_path)
+
+    print(f"Migrating post bodies in: {db_path}")
+
+    conn = connect(db_path)
+    if not has_inline_content(conn):
+        conn.close()
+        print("Post bodies are already stored out of row; nothing to do.")
+        return
+
+    size_before = os.path.getsize(db_path)
+    conn.execute('BEGIN')
+    for trigger in ('posts_fts_ai', 'posts_fts_ad', 'posts_fts_au'):
+        conn.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    conn.execute('DROP TABLE IF EXISTS posts_fts')
+    conn.execute(POST_BODIES_SQL)
+    rows = conn.execute('SELECT id, content FROM posts').fetchall()
+    conn.executemany('INSERT OR REPLACE INTO post_bodies (post_id, compressed, body) VALUES (?, ?, ?)',
+                     ((row['id'], *storage.pack_body(row['content'], threshold)) for row in rows))
+    conn.execute('ALTER TABLE posts DROP COLUMN content')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_posts_created_id ON posts (created, id)')
+    conn.execute('CREATE TABLE IF NOT EXISTS page_generations ('
+                 ' name TEXT PRIMARY KEY, generation INTEGER NOT NULL DEFAULT 0)')
+    conn.execute(SEARCH_INDEX_SQL)
+    reindex_posts(conn)
+    conn.execute('COMMIT')
+    conn.execute('VACUUM')
+    conn.close()
+    print(f"Migrated {len(rows)} posts; database size {size_before} -> {os.path.getsize(db_path)} bytes.")
+
+
 def init_db(schema_file=None, db_file=None, seed=True):
     schema_path = find_schema_file(schema_file or os.getenv('SCHEMA_FILE'))
     db_path = db_file or os.getenv('DATABASE_FILE') or default_db_path(schema_path)
@@ -42,15 +138,8 @@ def init_db(schema_file=None, db_file=None, seed=True):
         conn.executescript(f.read())
 
     if seed:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO posts (title, content) VALUES (?, ?)",
-            ('First Post', 'Content for the first post'),
-        )
-        cur.execute(
-            "INSERT INTO posts (title, content) VALUES (?, ?)",
-            ('Second Post', 'Content for the second post'),
-        )
+        storage.insert_post(conn, 'First Post', 'Content for the first post')
+        storage.insert_post(conn, 'Second Post', 'Content for the second post')
         conn.commit()
 
     conn.close()
@@ -59,10 +148,21 @@ def init_db(schema_file=None, db_file=None, seed=True):
 
 if __name__ == '__main__':
     # Allow optional CLI args: schema-file and db-file
-    schema_arg = sys.argv[1] if len(sys.argv) > 1 else None
-    db_arg = sys.argv[2] if len(sys.argv) > 2 else None
+    parser = argparse.ArgumentParser(description="Initialize the blog database.")
+    parser.add_argument('schema_file', nargs='?')
+    parser.add_argument('db_file', nargs='?')
+    parser.add_argument('--rebuild-search-index', action='store_true',
+                        help="keep existing posts and only (re)build the full-text index")
+    parser.add_argument('--migrate-post-bodies', action='store_true',
+                        help="move post content of an existing database into compressed out-of-row storage")
+    args = parser.parse_args()
     try:
-        init_db(schema_file=schema_arg, db_file=db_arg, seed=True)
+        if args.migrate_post_bodies:
+            migrate_post_bodies(schema_file=args.schema_file, db_file=args.db_file)
+        elif args.rebuild_search_index:
+            rebuild_search_index(schema_file=args.schema_file, db_file=args.db_file)
+        else:
+            init_db(schema_file=args.schema_file, db_file=args.db_file, seed=True)
     except Exception:
         print("Error while initializing database:")
         raise
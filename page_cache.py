@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+
+class PageCache:
+    """A size-bounded LRU of rendered HTML, validated by generation counters.
+
+    Each entry remembers the generation it was rendered at. The authoritative
+    generation lives in the database (``page_generations``) and is bumped by
+    every write, so a worker process whose entry predates another worker's
+    write sees a stale generation and re-renders instead of serving it.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, generation, html):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (generation, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_entries': self.max_entries,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def get_generation(conn, name):
+    row = conn.execute('SELECT generation FROM page_generations WHERE name = ?',
+                       (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def bump_generations(conn, *names):
+    """Invalidate every cached page rendered from ``names``.
+
+    Call inside the write's transaction so the bump commits with the data.
+    """
+    conn.executemany('INSERT INTO page_generations (name, generation) VALUES (?, 1)'
+                     ' ON CONFLICT(name) DO UPDATE SET generation = generation + 1',
+                     [(name,) for name in names])
@@ -1,8 +1,31 @@
+DROP TABLE IF EXISTS posts_fts;
+DROP TABLE IF EXISTS post_bodies;
 DROP TABLE IF EXISTS posts;
+DROP TABLE IF EXISTS page_generations;
 
 CREATE TABLE posts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-    title TEXT NOT NULL,
-    content TEXT NOT NULL
+    title TEXT NOT NULL
 );
+
+-- Post bodies live out of row so list queries only touch the narrow posts
+-- table. Bodies above a size threshold are zlib-compressed (compressed = 1).
+CREATE TABLE post_bodies (
+    post_id INTEGER PRIMARY KEY REFERENCES posts (id) ON DELETE CASCADE,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    body BLOB NOT NULL
+);
+
+-- Keyset pagination on the index page walks this index newest first.
+CREATE INDEX idx_posts_created_id ON posts (created, id);
+
+-- Bumped by every write; cached pages rendered at an older generation are stale.
+CREATE TABLE page_generations (
+    name TEXT PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0
+);
+
+-- Contentless full-text index over posts. Bodies are stored compressed, so
+-- the application (storage.py) keeps it in sync instead of triggers.
+CREATE VIRTUAL TABLE posts_fts USING fts5(title, content, content='');
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Report startup and first-request latency with and without precompiled templates.
+
+Each sample runs in a fresh interpreter, like a new container or worker:
+it imports the app (startup), then times its first request. The monolith
+serves ``/`` from a freshly initialised database. The frontend serves
+``/create``, which needs no upstream. The precompiled runs use a build made
+by ``flask precompile-templates`` in a temporary directory.
+
+Usage: python scripts/measure_templates.py [--runs N] [--output measurements/template_startup.csv]
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+APPS = {
+    "monolith": (ROOT, "/"),
+    "frontend": (ROOT / "services" / "frontend", "/create"),
+}
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+import app as module
+startup = time.perf_counter() - started
+client = module.app.test_client()
+started = time.perf_counter()
+status = client.get(sys.argv[1]).status_code
+first = time.perf_counter() - started
+started = time.perf_counter()
+client.get(sys.argv[1])
+second = time.perf_counter() - started
+print(json.dumps({"status": status, "precompiled": module.app.extensions["template_cache"],
+                  "startup": startup, "first": first, "second": second}))
+"""
+
+
+def sample(app_dir, path, env):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, path], cwd=app_dir, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", default=str(ROOT / "measurements" / "template_startup.csv"))
+    args = parser.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "database.db")
+        subprocess.run([sys.executable, "init_db.py", "schema.sql", db_path], cwd=ROOT, check=True, capture_output=True)
+        for name, (app_dir, path) in APPS.items():
+            build = os.path.join(tmp, f"{name}-templates")
+            env = dict(os.environ, DATABASE_FILE=db_path, PYTHONDONTWRITEBYTECODE="1")
+            subprocess.run(
+                [sys.executable, "-m", "flask", "--app", "app", "precompile-templates", "--output", build],
+                cwd=app_dir, env=env, check=True, capture_output=True,
+            )
+            for mode, templates in (("source", os.path.join(tmp, "none")), ("precompiled", build)):
+                results = [sample(app_dir, path, dict(env, PRECOMPILED_TEMPLATES=templates)) for _ in range(args.runs)]
+                assert all(r["status"] == 200 and r["precompiled"] == (mode == "precompiled") for r in results)
+                row = {"app": name, "mode": mode, "runs": args.runs}
+                for key in ("startup", "first", "second"):
+                    row[f"{key}_ms"] = round(statistics.median(r[key] for r in results) * 1000, 2)
+                rows.append(row)
+                print(f"{name:<9} {mode:<12} startup {row['startup_ms']:8.2f} ms  "
+                      f"first request {row['first_ms']:7.2f} ms  second {row['second_ms']:6.2f} ms")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Template startup measurements written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
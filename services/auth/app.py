@@ -1,27 +1,60 @@
+import hashlib
 import os
+import secrets
 import sqlite3
+import threading
 from datetime import datetime, timedelta, timezone
 
 import jwt
 from flask import Flask, jsonify, request
-from werkzeug.security import check_password_hash, generate_password_hash
+
+import migrate
+from compression import Compress
+from hashing import HashPool, HashPoolFull, load_hash_config, needs_rehash
+from signing import Signer
+from token_cache import TokenCache, token_digest
 
 app = Flask(__name__)
 
 DEFAULT_DB_PATH = os.getenv("AUTH_DB_PATH") or os.getenv("DATABASE_PATH") or "auth.db"
-DEFAULT_SCHEMA_PATH = os.getenv("AUTH_SCHEMA_PATH") or os.path.join(os.path.dirname(__file__), "schema.sql")
+DEFAULT_MIGRATIONS_PATH = os.getenv("AUTH_MIGRATIONS_PATH") or migrate.DEFAULT_MIGRATIONS_PATH
 DEFAULT_JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret")
 DEFAULT_JWT_ALGO = os.getenv("JWT_ALGORITHM", "HS256")
-DEFAULT_JWT_EXP_MINUTES = int(os.getenv("JWT_EXPIRES_MINUTES", "60"))
+# Access tokens are short-lived; clients renew them with a refresh token
+# instead of repeating the password check.
+DEFAULT_JWT_EXP_MINUTES = int(os.getenv("JWT_EXPIRES_MINUTES", "15"))
+DEFAULT_REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "30"))
+# Written by calibrate_hash.py; PASSWORD_HASH_METHOD overrides it.
+DEFAULT_HASH_CONFIG_PATH = os.getenv("HASH_CONFIG_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "hash_config.json"
+)
 
 app.config.update(
     DATABASE_PATH=DEFAULT_DB_PATH,
-    SCHEMA_PATH=DEFAULT_SCHEMA_PATH,
+    MIGRATIONS_PATH=DEFAULT_MIGRATIONS_PATH,
     JWT_SECRET=DEFAULT_JWT_SECRET,
     JWT_ALGORITHM=DEFAULT_JWT_ALGO,
     JWT_EXPIRES_MINUTES=DEFAULT_JWT_EXP_MINUTES,
+    REFRESH_TOKEN_DAYS=DEFAULT_REFRESH_TOKEN_DAYS,
+    # RS256/EdDSA only: PEM private key, optional kid (defaults to the key's
+    # RFC 7638 thumbprint) and comma-separated retired keys still accepted.
+    JWT_PRIVATE_KEY_PATH=os.getenv("JWT_PRIVATE_KEY_PATH"),
+    JWT_KEY_ID=os.getenv("JWT_KEY_ID"),
+    JWT_VERIFY_KEY_PATHS=os.getenv("JWT_VERIFY_KEY_PATHS", ""),
+    JWKS_MAX_AGE=int(os.getenv("JWKS_MAX_AGE", "300")),
+    TOKEN_CACHE_SIZE=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+    TOKEN_CACHE_MAX_AGE=float(os.getenv("TOKEN_CACHE_MAX_AGE", "60")),
+    HASH_WORKERS=int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1))),
+    HASH_QUEUE_DEPTH=int(os.getenv("HASH_QUEUE_DEPTH", "16")),
+    HASH_TIMEOUT=float(os.getenv("HASH_TIMEOUT", "30")),
+    HASH_RETRY_AFTER=int(os.getenv("HASH_RETRY_AFTER", "1")),
+    PASSWORD_HASH_METHOD=os.getenv("PASSWORD_HASH_METHOD") or load_hash_config(DEFAULT_HASH_CONFIG_PATH) or "pbkdf2",
 )
 
+Compress(app)
+
+token_cache = TokenCache(app.config["TOKEN_CACHE_SIZE"], app.config["TOKEN_CACHE_MAX_AGE"])
+
 
 def get_db_connection():
     conn = sqlite3.connect(app.config["DATABASE_PATH"])
@@ -29,6 +62,48 @@ def get_db_connection():
     return conn
 
 
+_hash_pool_lock = threading.Lock()
+
+
+def get_hash_pool():
+    """Return the process's password-hash pool, starting it on first use."""
+    pool = app.extensions.get("hash_pool")
+    if pool is None:
+        with _hash_pool_lock:
+            pool = app.extensions.get("hash_pool")
+            if pool is None:
+                pool = HashPool(
+                    max_workers=app.config["HASH_WORKERS"],
+                    max_queue=app.config["HASH_QUEUE_DEPTH"],
+                    timeout=app.config["HASH_TIMEOUT"],
+                )
+                app.extensions["hash_pool"] = pool
+    return pool
+
+
+@app.errorhandler(HashPoolFull)
+def hash_pool_full(exc):
+    resp = jsonify({"error": "Too many concurrent sign-ins, retry shortly"})
+    resp.headers["Retry-After"] = str(app.config["HASH_RETRY_AFTER"])
+    return resp, 503
+
+
+_migrated_paths = set()
+_migrate_lock = threading.Lock()
+
+
+@app.before_request
+def ensure_migrated():
+    """Apply pending migrations once per process and database (see migrate.py)."""
+    db_path = app.config["DATABASE_PATH"]
+    if db_path in _migrated_paths:
+        return
+    with _migrate_lock:
+        if db_path not in _migrated_paths:
+            migrate.apply_migrations(db_path, app.config["MIGRATIONS_PATH"])
+            _migrated_paths.add(db_path)
+
+
 def row_to_user(row):
     return {
         "id": row["id"],
@@ -37,23 +112,79 @@ def row_to_user(row):
     }
 
 
-def issue_token(user):
+_SIGNER_SETTINGS = ("JWT_ALGORITHM", "JWT_SECRET", "JWT_PRIVATE_KEY_PATH", "JWT_KEY_ID", "JWT_VERIFY_KEY_PATHS")
+_signer_lock = threading.Lock()
+
+
+def get_signer():
+    """Return the token Signer for the current JWT_* settings, loading keys once."""
+    settings = tuple(app.config.get(name) for name in _SIGNER_SETTINGS)
+    cached = app.extensions.get("jwt_signer")
+    if cached is None or cached[0] != settings:
+        with _signer_lock:
+            cached = app.extensions.get("jwt_signer")
+            if cached is None or cached[0] != settings:
+                cached = (settings, Signer.from_config(app.config))
+                app.extensions["jwt_signer"] = cached
+    return cached[1]
+
+
+def issue_token(user, version):
     exp = datetime.now(timezone.utc) + timedelta(minutes=app.config["JWT_EXPIRES_MINUTES"])
     payload = {
         "sub": user["id"],
         "username": user["username"],
+        "ver": version,
         "exp": exp,
     }
-    token = jwt.encode(payload, app.config["JWT_SECRET"], algorithm=app.config["JWT_ALGORITHM"])
+    token = get_signer().sign(payload)
     # PyJWT<2 returns bytes; normalize to str so headers are correct.
     if isinstance(token, bytes):
         token = token.decode("utf-8")
     return token
 
 
+def refresh_token_hash(token):
+    # Refresh tokens are 256 random bits, so a plain digest is enough: there
+    # is nothing for a key-derivation function to protect.
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+def issue_refresh_token(conn, user_id, user_version, family=None):
+    """Store a new refresh token and return ``(id, token)``; the caller commits."""
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.utcnow() + timedelta(days=app.config["REFRESH_TOKEN_DAYS"])
+    cur = conn.execute(
+        "INSERT INTO refresh_tokens (token_hash, user_id, user_version, family, expires_at) VALUES (?, ?, ?, ?, ?)",
+        (refresh_token_hash(token), user_id, user_version, family or secrets.token_hex(16), expires_at),
+    )
+    return cur.lastrowid, token
+
+
+def revoke_refresh_family(conn, family):
+    conn.execute(
+        "UPDATE refresh_tokens SET revoked_at = ? WHERE family = ? AND revoked_at IS NULL",
+        (datetime.utcnow(), family),
+    )
+
+
+def token_response(conn, user, status):
+    """Issue an access token and a fresh refresh-token family for ``user``."""
+    user_data = row_to_user(user)
+    _, refresh_token = issue_refresh_token(conn, user["id"], user["version"])
+    conn.commit()
+    body = {
+        "token": issue_token(user_data, user["version"]),
+        "refresh_token": refresh_token,
+        "expires_in": app.config["JWT_EXPIRES_MINUTES"] * 60,
+        "user": user_data,
+    }
+    return jsonify(body), status
+
+
 def parse_token(token):
     try:
-        return jwt.decode(token, app.config["JWT_SECRET"], algorithms=[app.config["JWT_ALGORITHM"]])
+        return get_signer().decode(token)
     except jwt.InvalidTokenError:
         return None
 
@@ -63,6 +194,11 @@ def get_current_user():
     if not auth_header.startswith("Bearer "):
         return None
     token = auth_header.split(" ", 1)[1]
+    digest = token_digest(token)
+    cached = token_cache.get(digest)
+    if cached is not None:
+        return dict(cached.user)
+
     payload = parse_token(token)
     if not payload:
         return None
@@ -71,7 +207,14 @@ def get_current_user():
     conn.close()
     if not user:
         return None
-    return row_to_user(user)
+    # Tokens issued before the user last changed (e.g. a password reset) are
+    # no longer honoured. Tokens predating the "ver" claim are accepted.
+    if payload.get("ver", user["version"]) != user["version"]:
+        token_cache.bump_user(user["id"], user["version"])
+        return None
+    user_data = row_to_user(user)
+    token_cache.put(digest, payload, user_data, user["version"])
+    return dict(user_data)
 
 
 @app.route("/health", methods=["GET"])
@@ -79,6 +222,25 @@ def health():
     return jsonify({"status": "ok"}), 200
 
 
+@app.route("/.well-known/jwks.json", methods=["GET"])
+def jwks():
+    """Public keys for verifying access tokens locally (empty under HS256)."""
+    resp = jsonify(get_signer().jwks())
+    resp.cache_control.public = True
+    resp.cache_control.max_age = app.config["JWKS_MAX_AGE"]
+    return resp, 200
+
+
+@app.route("/metrics/token-cache", methods=["GET"])
+def token_cache_stats():
+    return jsonify(token_cache.stats()), 200
+
+
+@app.route("/metrics/hashing", methods=["GET"])
+def hashing_stats():
+    return jsonify(get_hash_pool().stats()), 200
+
+
 def validate_credentials(data):
     if not isinstance(data, dict):
         return False, "Invalid JSON payload"
@@ -99,22 +261,27 @@ def signup():
 
     conn = get_db_connection()
     existing = conn.execute("SELECT * FROM users WHERE username = ?", (payload["username"],)).fetchone()
+    conn.close()
     if existing:
-        conn.close()
         return jsonify({"error": "Username already exists"}), 409
 
-    hashed = generate_password_hash(payload["password"])
+    # No connection is held while the hash runs on the pool.
+    hashed = get_hash_pool().generate(payload["password"], app.config["PASSWORD_HASH_METHOD"])
+    conn = get_db_connection()
     cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO users (username, password_hash, created) VALUES (?, ?, ?)",
-        (payload["username"], hashed, datetime.utcnow()),
-    )
-    conn.commit()
+    try:
+        cur.execute(
+            "INSERT INTO users (username, password_hash, created) VALUES (?, ?, ?)",
+            (payload["username"], hashed, datetime.utcnow()),
+        )
+    except sqlite3.IntegrityError:
+        conn.close()
+        return jsonify({"error": "Username already exists"}), 409
     user = conn.execute("SELECT * FROM users WHERE id = ?", (cur.lastrowid,)).fetchone()
-    conn.close()
-    user_data = row_to_user(user)
-    token = issue_token(user_data)
-    return jsonify({"token": token, "user": user_data}), 201
+    try:
+        return token_response(conn, user, 201)
+    finally:
+        conn.close()
 
 
 @app.route("/login", methods=["POST"])
@@ -126,12 +293,112 @@ def login():
     conn = get_db_connection()
     user = conn.execute("SELECT * FROM users WHERE username = ?", (payload["username"],)).fetchone()
     conn.close()
-    if not user or not check_password_hash(user["password_hash"], payload["password"]):
+    if not user or not get_hash_pool().check(user["password_hash"], payload["password"]):
         return jsonify({"error": "Invalid credentials"}), 401
 
-    user_data = row_to_user(user)
-    token = issue_token(user_data)
-    return jsonify({"token": token, "user": user_data}), 200
+    conn = get_db_connection()
+    try:
+        if needs_rehash(user["password_hash"], app.config["PASSWORD_HASH_METHOD"]):
+            rehash_password(conn, user, payload["password"])
+        return token_response(conn, user, 200)
+    finally:
+        conn.close()
+
+
+def rehash_password(conn, user, password):
+    """Re-hash a just-verified password with the current parameters.
+
+    A rehash is not a credential change, so the user's version (and with
+    it every issued token) is restored after the trigger bumps it. If the
+    hash pool is saturated the upgrade simply waits for a later login.
+    """
+    try:
+        new_hash = get_hash_pool().rehash(password, app.config["PASSWORD_HASH_METHOD"])
+    except HashPoolFull:
+        return
+    updated = conn.execute(
+        "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+        (new_hash, user["id"], user["password_hash"]),
+    ).rowcount
+    if updated:
+        conn.execute("UPDATE users SET version = ? WHERE id = ?", (user["version"], user["id"]))
+    conn.commit()
+
+
+def refresh_token_from_request():
+    data = request.get_json(silent=True)
+    token = data.get("refresh_token") if isinstance(data, dict) else None
+    return token if isinstance(token, str) and token else None
+
+
+@app.route("/token/refresh", methods=["POST"])
+def refresh():
+    """Swap a refresh token for a new access token and a rotated refresh token.
+
+    One indexed lookup and one write transaction; no password hashing.
+    """
+    token = refresh_token_from_request()
+    if token is None:
+        return jsonify({"error": "refresh_token is required"}), 400
+
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT refresh_tokens.id, refresh_tokens.family, refresh_tokens.user_version,"
+            " refresh_tokens.expires_at, refresh_tokens.revoked_at,"
+            " users.id AS user_id, users.username, users.created, users.version"
+            " FROM refresh_tokens JOIN users ON users.id = refresh_tokens.user_id"
+            " WHERE refresh_tokens.token_hash = ?",
+            (refresh_token_hash(token),),
+        ).fetchone()
+        if row is None:
+            return jsonify({"error": "Invalid refresh token"}), 401
+        if row["revoked_at"] is not None or row["user_version"] != row["version"]:
+            # A rotated token presented again means it leaked (or the user
+            # changed since): shut down every token in its chain.
+            revoke_refresh_family(conn, row["family"])
+            conn.commit()
+            return jsonify({"error": "Invalid refresh token"}), 401
+        if datetime.fromisoformat(str(row["expires_at"])) <= datetime.utcnow():
+            return jsonify({"error": "Refresh token expired"}), 401
+
+        new_id, new_token = issue_refresh_token(conn, row["user_id"], row["version"], row["family"])
+        rotated = conn.execute(
+            "UPDATE refresh_tokens SET revoked_at = ?, replaced_by = ? WHERE id = ? AND revoked_at IS NULL",
+            (datetime.utcnow(), new_id, row["id"]),
+        ).rowcount
+        if not rotated:  # lost a race with a concurrent refresh of the same token
+            conn.rollback()
+            return jsonify({"error": "Invalid refresh token"}), 401
+        conn.commit()
+    finally:
+        conn.close()
+
+    user_data = {"id": row["user_id"], "username": row["username"], "created": row["created"]}
+    body = {
+        "token": issue_token(user_data, row["version"]),
+        "refresh_token": new_token,
+        "expires_in": app.config["JWT_EXPIRES_MINUTES"] * 60,
+        "user": user_data,
+    }
+    return jsonify(body), 200
+
+
+@app.route("/token/revoke", methods=["POST"])
+def revoke():
+    """Log out: revoke the refresh token and every token rotated from the same login."""
+    token = refresh_token_from_request()
+    if token is None:
+        return jsonify({"error": "refresh_token is required"}), 400
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT family FROM refresh_tokens WHERE token_hash = ?", (refresh_token_hash(token),)
+    ).fetchone()
+    if row is not None:
+        revoke_refresh_family(conn, row["family"])
+        conn.commit()
+    conn.close()
+    return jsonify({"message": "Refresh token revoked"}), 200
 
 
 @app.route("/me", methods=["GET"])
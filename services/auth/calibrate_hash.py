@@ -0,0 +1,112 @@
+"""Pick password-hash parameters for this machine.
+
+Benchmarks increasing costs of one werkzeug scheme, prints the latency
+distribution of each, and writes the strongest method whose p95 stays within
+the target to the config file the auth service reads at start-up
+(``HASH_CONFIG_PATH``, default ``hash_config.json`` next to app.py). Run it
+on the hardware the service is deployed on:
+
+    python calibrate_hash.py --target-ms 250 --scheme scrypt
+
+Existing users are moved to the new parameters on their next login, so
+by default nothing cheaper than werkzeug's own defaults is considered;
+``--min-cost`` lowers (or raises) that floor explicitly.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash
+
+from hashing import summarize
+
+DEFAULT_OUTPUT = os.getenv("HASH_CONFIG_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "hash_config.json"
+)
+
+PBKDF2_ITERATIONS = [100_000, 150_000, 200_000, 300_000, 400_000, 600_000, 800_000, 1_200_000, 1_600_000, 2_400_000]
+SCRYPT_N = [2**14, 2**15, 2**16, 2**17, 2**18]
+# werkzeug's defaults; every user is rehashed to the chosen cost, so going
+# below these weakens every stored password.
+DEFAULT_MIN_COST = {"pbkdf2": DEFAULT_PBKDF2_ITERATIONS, "scrypt": 2**15}
+
+
+def candidates(scheme, min_cost):
+    if scheme == "pbkdf2":
+        return [f"pbkdf2:sha256:{n}" for n in PBKDF2_ITERATIONS if n >= min_cost]
+    return [f"scrypt:{n}:8:1" for n in SCRYPT_N if n >= min_cost]
+
+
+def measure(method, samples):
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        generate_password_hash("calibration-password", method)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def calibrate(scheme="pbkdf2", target_ms=250.0, samples=5, min_cost=None, report=print):
+    """Return the calibration result: the chosen method plus every measurement.
+
+    Costs are tried cheapest first and the search stops once a median runs
+    well past the target. If even the cheapest candidate misses, it is
+    chosen anyway; the floor is ``min_cost`` (werkzeug's default if None).
+    Raises ValueError if no candidate cost reaches the floor.
+    """
+    if min_cost is None:
+        min_cost = DEFAULT_MIN_COST[scheme]
+    methods = candidates(scheme, min_cost)
+    if not methods:
+        raise ValueError(f"no {scheme} cost to try is at least {min_cost}")
+    measured = []
+    chosen = None
+    for method in methods:
+        stats = summarize(measure(method, samples))
+        measured.append(dict(stats, method=method))
+        report(f"{method:<24} p50 {stats['p50_ms']:9.1f} ms  p95 {stats['p95_ms']:9.1f} ms  max {stats['max_ms']:9.1f} ms")
+        if stats["p95_ms"] <= target_ms:
+            chosen = method
+        if stats["p50_ms"] > target_ms * 1.5:
+            break
+    if chosen is None:
+        chosen = measured[0]["method"]
+    return {
+        "method": chosen,
+        "target_ms": target_ms,
+        "samples": samples,
+        "host": platform.node(),
+        "calibrated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "candidates": measured,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate password-hash cost for this machine.")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="per-hash p95 budget (default 250)")
+    parser.add_argument("--scheme", choices=("pbkdf2", "scrypt"), default="pbkdf2")
+    parser.add_argument("--samples", type=int, default=5, help="hashes timed per candidate (default 5)")
+    parser.add_argument(
+        "--min-cost", type=int, default=None, help="lowest iteration count / scrypt N to consider (default werkzeug's)"
+    )
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"config file to write (default {DEFAULT_OUTPUT})")
+    args = parser.parse_args(argv)
+
+    try:
+        result = calibrate(args.scheme, args.target_ms, args.samples, args.min_cost)
+    except ValueError as exc:
+        parser.error(str(exc))
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+        f.write("\n")
+    print(f"Chose {result['method']} (target p95 {args.target_ms:g} ms); wrote {args.output}")
+    if result["method"].startswith("pbkdf2:") and int(result["method"].rsplit(":", 1)[1]) < DEFAULT_PBKDF2_ITERATIONS:
+        print(f"warning: fewer iterations than werkzeug's default of {DEFAULT_PBKDF2_ITERATIONS}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Password hashing off the request threads, with bounded concurrency.
+
+werkzeug's hash functions are deliberately slow key derivations. Running
+them inline let a login burst occupy every request worker, so cheap
+endpoints (``/health``, ``/me``) queued behind them. Hashes now run on a
+dedicated process pool. At most ``max_workers + max_queue`` hashes are
+admitted at once; beyond that ``HashPoolFull`` is raised immediately, which
+the app turns into a 503 with ``Retry-After`` instead of letting the queue
+(and every client's latency) grow without bound. A hash that outlives
+``timeout`` raises ``HashTimeout`` (also a 503) but keeps its slot until it
+actually finishes, so the bound holds even when hashing is slow.
+
+The hash method (scheme and cost) comes from ``PASSWORD_HASH_METHOD`` or the
+file written by ``calibrate_hash.py``; hashes stored with other parameters
+are upgraded on the next successful login (see ``needs_rehash``).
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+SAMPLE_SIZE = 1024
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults, e.g. ``pbkdf2`` -> ``pbkdf2:sha256:600000``."""
+    scheme, *args = method.split(":")
+    if scheme == "pbkdf2":
+        hash_name = args[0] if args else "sha256"
+        iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    if scheme == "scrypt":
+        n, r, p = map(int, args) if args else (2**15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    return method
+
+
+def needs_rehash(pwhash, method):
+    """True if ``pwhash`` was not made with ``method``'s scheme and cost."""
+    return pwhash.split("$", 1)[0] != normalize_method(method)
+
+
+def load_hash_config(path):
+    """Return the method chosen by calibrate_hash.py, or None if not calibrated."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)["method"]
+
+
+class HashPoolFull(Exception):
+    """Raised when the hash pool has no room for another operation."""
+
+
+class HashTimeout(HashPoolFull):
+    """Raised when an operation did not finish within the pool's timeout."""
+
+
+def _timed(fn, *args):
+    # Runs in the worker process: report the hash's own CPU-bound time so
+    # it can be told apart from time spent queued.
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def summarize(samples):
+    """Return count/mean/p50/p95/p99/max (milliseconds) for a list of seconds."""
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+    }
+
+
+class HashPool:
+    def __init__(self, max_workers=2, max_queue=8, timeout=30.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        # The pool starts inside a threaded server, and a worker forked from
+        # it could inherit a lock another thread holds. Workers are forked
+        # from a forkserver instead, a fresh interpreter with no such threads.
+        context = multiprocessing.get_context("forkserver")
+        self._executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._latency = {}
+        self._hash_time = {}
+
+    def submit(self, op, fn, *args):
+        """Run ``fn(*args)`` on the pool and return its result.
+
+        Raises HashPoolFull without waiting when the pool is saturated, and
+        HashTimeout if the result takes longer than ``timeout``.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashPoolFull(op)
+        started = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            future = self._executor.submit(_timed, fn, *args)
+        except BaseException:
+            self._finished(None)
+            raise
+        # The slot is freed when the work is done, not when we stop waiting.
+        future.add_done_callback(self._finished)
+        try:
+            result, hash_time = future.result(self.timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._timed_out += 1
+            raise HashTimeout(op) from None
+        with self._lock:
+            self._latency.setdefault(op, deque(maxlen=SAMPLE_SIZE)).append(time.perf_counter() - started)
+            self._hash_time.setdefault(op, deque(maxlen=SAMPLE_SIZE)).append(hash_time)
+        return result
+
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def generate(self, password, *args):
+        return self.submit("generate", generate_password_hash, password, *args)
+
+    def check(self, pwhash, password):
+        return self.submit("check", check_password_hash, pwhash, password)
+
+    def rehash(self, password, method):
+        return self.submit("rehash", generate_password_hash, password, method)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "latency": {op: summarize(list(s)) for op, s in self._latency.items()},
+                "hash_time": {op: summarize(list(s)) for op, s in self._hash_time.items()},
+            }
@@ -1,5 +1,4 @@
-DROP TABLE IF EXISTS users;
-
+-- Baseline: the users table as created by the original schema.sql.
 CREATE TABLE users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -0,0 +1,7 @@
+-- A per-user version, bumped whenever the row changes. Tokens carry the
+-- version they were issued at, and cached verifications are keyed to it.
+ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+
+CREATE TRIGGER users_version_au AFTER UPDATE OF username, password_hash ON users BEGIN
+    UPDATE users SET version = version + 1 WHERE id = NEW.id;
+END;
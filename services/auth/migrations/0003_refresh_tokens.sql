@@ -0,0 +1,18 @@
+-- Long-lived, revocable refresh tokens. Only a SHA-256 of each token is
+-- stored; the unique index makes /token/refresh a single indexed lookup.
+-- Tokens rotate on use: each one records its replacement, and all tokens
+-- descended from one login share a family so reuse of a rotated token
+-- revokes the whole chain.
+CREATE TABLE refresh_tokens (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token_hash BLOB NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+    user_version INTEGER NOT NULL,
+    family TEXT NOT NULL,
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP,
+    replaced_by INTEGER REFERENCES refresh_tokens (id)
+);
+
+CREATE INDEX idx_refresh_tokens_family ON refresh_tokens (family);
@@ -0,0 +1,133 @@
+"""Token signing keys for the auth service.
+
+HS256 with ``JWT_SECRET`` remains the default, but then only holders of the
+secret can check a token. With ``JWT_ALGORITHM=RS256`` or ``EdDSA`` tokens
+are signed with a private key and carry its ``kid``; the public half is
+published at ``/.well-known/jwks.json`` so other services verify tokens
+in-process (see ``jwt_verifier.py`` in blog-api and frontend).
+
+Retired public keys listed in ``JWT_VERIFY_KEY_PATHS`` stay published and
+accepted until every token they signed has expired, which makes rotation a
+config change. Each entry is a path, or ``kid=path`` for a key whose tokens
+were issued under a ``JWT_KEY_ID`` rather than its thumbprint.
+"""
+import base64
+import hashlib
+import json
+import logging
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "EdDSA")
+
+log = logging.getLogger(__name__)
+
+
+def jwk_for(public_key):
+    """Return the public JWK (as a dict) for an RSA or Ed25519 public key."""
+    if isinstance(public_key, rsa.RSAPublicKey):
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(public_key))
+        jwk["alg"] = "RS256"
+    elif isinstance(public_key, ed25519.Ed25519PublicKey):
+        jwk = json.loads(jwt.algorithms.OKPAlgorithm.to_jwk(public_key))
+        jwk["alg"] = "EdDSA"
+    else:
+        raise ValueError(f"Unsupported key type {type(public_key).__name__}")
+    jwk["use"] = "sig"
+    return jwk
+
+
+def thumbprint(jwk):
+    """RFC 7638 JWK thumbprint, used as the default ``kid``."""
+    required = {"RSA": ("e", "kty", "n"), "OKP": ("crv", "kty", "x")}[jwk["kty"]]
+    canonical = json.dumps({k: jwk[k] for k in required}, separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(canonical.encode("utf-8")).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def load_private_key(path):
+    with open(path, "rb") as f:
+        return serialization.load_pem_private_key(f.read(), password=None)
+
+
+def load_public_key(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        return serialization.load_pem_public_key(data)
+    except ValueError:
+        return serialization.load_pem_private_key(data, password=None).public_key()
+
+
+def generate_private_key(algorithm):
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+class Signer:
+    """Signs and verifies the service's access tokens."""
+
+    def __init__(self, algorithm="HS256", secret=None, private_key=None, key_id=None, verify_keys=()):
+        """``verify_keys`` are retired ``(kid, public_key)`` pairs; a None kid means the thumbprint."""
+        self.algorithm = algorithm
+        self.secret = secret
+        self.private_key = private_key
+        self.key_id = None
+        self._verify_keys = {}
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            return
+        if private_key is None:
+            log.warning("No JWT private key configured; using an ephemeral %s key for this process", algorithm)
+            private_key = self.private_key = generate_private_key(algorithm)
+        signing_jwk = jwk_for(private_key.public_key())
+        if signing_jwk["alg"] != algorithm:
+            raise ValueError(f"JWT key is a {signing_jwk['alg']} key but JWT_ALGORITHM is {algorithm}")
+        self.key_id = key_id or thumbprint(signing_jwk)
+        self._verify_keys[self.key_id] = (private_key.public_key(), signing_jwk)
+        for kid, public_key in verify_keys:
+            jwk = jwk_for(public_key)
+            self._verify_keys.setdefault(kid or thumbprint(jwk), (public_key, jwk))
+
+    @classmethod
+    def from_config(cls, config):
+        algorithm = config["JWT_ALGORITHM"]
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            return cls(algorithm, secret=config["JWT_SECRET"])
+        path = config.get("JWT_PRIVATE_KEY_PATH")
+        verify_keys = []
+        for entry in (config.get("JWT_VERIFY_KEY_PATHS") or "").split(","):
+            kid, _, verify_path = entry.strip().rpartition("=")
+            if verify_path:
+                verify_keys.append((kid or None, load_public_key(verify_path)))
+        return cls(
+            algorithm,
+            private_key=load_private_key(path) if path else None,
+            key_id=config.get("JWT_KEY_ID"),
+            verify_keys=verify_keys,
+        )
+
+    def sign(self, payload):
+        if self.key_id is None:
+            return jwt.encode(payload, self.secret, algorithm=self.algorithm)
+        return jwt.encode(payload, self.private_key, algorithm=self.algorithm, headers={"kid": self.key_id})
+
+    def decode(self, token):
+        """Return the verified claims; raises jwt.InvalidTokenError."""
+        if self.key_id is None:
+            return jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        kid = jwt.get_unverified_header(token).get("kid")
+        entry = self._verify_keys.get(kid)
+        if entry is None:
+            raise jwt.InvalidTokenError(f"Unknown key id {kid!r}")
+        public_key, jwk = entry
+        return jwt.decode(token, public_key, algorithms=[jwk["alg"]])
+
+    def jwks(self):
+        """The published key set; empty for shared-secret algorithms."""
+        keys = []
+        for kid, (_, jwk) in self._verify_keys.items():
+            keys.append(dict(jwk, kid=kid))
+        return {"keys": keys}
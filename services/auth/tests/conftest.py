@@ -7,15 +7,34 @@ import pytest
 from werkzeug.security import generate_password_hash
 
 
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(autouse=True)
+def service_modules():
+    """Make this service's top-level modules the importable ones.
+
+    The monolith and each service have modules with the same names (``app``,
+    ``db``, ``migrate``, ...). A ``pytest`` run from the repo root imports
+    them all into one interpreter, so forget whichever copies another suite
+    loaded and put this service first on ``sys.path``.
+    """
+    for path in SERVICE_ROOT.glob("*.py"):
+        sys.modules.pop(path.stem, None)
+    sys.path.insert(0, str(SERVICE_ROOT))
+    yield
+    sys.path.remove(str(SERVICE_ROOT))
+
+
 @pytest.fixture
 def client(tmp_path):
     """Create a Flask test client for the auth service backed by a temp SQLite DB."""
-    service_root = Path(__file__).resolve().parents[1]
     db_path = tmp_path / "auth.db"
 
+    import migrate
+
+    migrate.apply_migrations(str(db_path))
     conn = sqlite3.connect(db_path)
-    with open(service_root / "schema.sql", "r") as f:
-        conn.executescript(f.read())
     cur = conn.cursor()
     cur.execute(
         "INSERT INTO users (username, password_hash) VALUES (?, ?)",
@@ -24,8 +43,6 @@ def client(tmp_path):
     conn.commit()
     conn.close()
 
-    sys.path.insert(0, str(service_root))
-
     import app as auth_app
 
     importlib.reload(auth_app)
@@ -39,3 +39,269 @@ def test_me_with_token(client):
 def test_signup_duplicate_username(client):
     res = client.post("/signup", json={"username": "alice", "password": "another"})
     assert res.status_code == 409
+
+
+def test_responses_are_gzipped_when_large_enough(client):
+    import gzip
+    import json
+
+    res = client.post("/login", json={"username": "alice", "password": "password123"}, headers={"Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert "Content-Encoding" not in res.headers  # below COMPRESS_MIN_SIZE
+    assert "Accept-Encoding" in res.headers["Vary"]
+
+    client.application.config["COMPRESS_MIN_SIZE"] = 0
+    res = client.post("/login", json={"username": "alice", "password": "password123"}, headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert "token" in json.loads(gzip.decompress(res.data))
+
+
+def test_me_uses_verified_token_cache(client):
+    import sqlite3
+
+    import app as auth_app
+
+    token = client.post("/login", json={"username": "alice", "password": "password123"}).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(3):
+        assert client.get("/me", headers=headers).get_json()["username"] == "alice"
+    stats = client.get("/metrics/token-cache").get_json()
+    assert stats["entries"] == 1
+    assert stats["hits"] == 2
+
+    # changing the user bumps its version: cached and fresh checks both reject
+    conn = sqlite3.connect(client.application.config["DATABASE_PATH"])
+    conn.execute("UPDATE users SET password_hash = 'x' WHERE username = 'alice'")
+    conn.commit()
+    version = conn.execute("SELECT version FROM users WHERE username = 'alice'").fetchone()[0]
+    conn.close()
+    auth_app.token_cache.bump_user(1, version)
+    assert client.get("/me", headers=headers).status_code == 401
+    assert client.get("/metrics/token-cache").get_json()["stale"] == 1
+
+
+def test_token_cache_expires_at_exp():
+    from token_cache import TokenCache
+
+    now = [1000.0]
+    cache = TokenCache(max_entries=2, max_age=60, clock=lambda: now[0])
+    cache.put(b"a", {"exp": 1010}, {"id": 1}, 1)
+    assert cache.get(b"a") is not None
+    now[0] = 1010
+    assert cache.get(b"a") is None
+
+    cache.put(b"b", {"exp": 5000}, {"id": 1}, 1)
+    cache.put(b"c", {"exp": 5000}, {"id": 2}, 1)
+    cache.put(b"d", {"exp": 5000}, {"id": 3}, 1)
+    assert cache.get(b"b") is None  # evicted, the cache is bounded
+    now[0] = 1010 + 60
+    assert cache.get(b"c") is None  # max_age caps entries with a far exp
+
+
+def test_token_cache_bounds_user_versions():
+    from token_cache import TokenCache
+
+    cache = TokenCache(max_entries=2, max_age=60, clock=lambda: 1000.0)
+    cache.put(b"a", {"exp": 5000}, {"id": 1}, 1)
+    cache.bump_user(2, 3)
+    cache.bump_user(3, 1)
+    assert len(cache._user_versions) == 2
+    # user 1's version was evicted, so its entry is verified again
+    assert cache.get(b"a") is None
+    cache.put(b"a", {"exp": 5000}, {"id": 1}, 1)
+    assert cache.get(b"a") is not None
+
+
+def test_hashing_runs_on_bounded_pool(client):
+    import time
+
+    import app as auth_app
+
+    client.application.config.update(HASH_WORKERS=1, HASH_QUEUE_DEPTH=0, HASH_RETRY_AFTER=2)
+    pool = auth_app.get_hash_pool()
+    # workers are not forked from the threaded server
+    assert pool._executor._mp_context.get_start_method() == "forkserver"
+    assert client.post("/login", json={"username": "alice", "password": "password123"}).status_code == 200
+
+    # occupy the only slot; the next login is shed instead of queued
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        busy = runner.submit(pool.submit, "sleep", time.sleep, 0.5)
+        time.sleep(0.1)
+        res = client.post("/login", json={"username": "alice", "password": "password123"})
+        assert res.status_code == 503
+        assert res.headers["Retry-After"] == "2"
+        assert client.get("/health").status_code == 200
+        busy.result()
+
+    stats = client.get("/metrics/hashing").get_json()
+    assert stats["rejected"] == 1
+    assert stats["latency"]["check"]["count"] == 1
+    assert stats["hash_time"]["check"]["p95_ms"] > 0
+    pool.close()
+
+
+def test_rs256_tokens_verify_against_published_jwks(client, tmp_path):
+    import jwt
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    assert client.get("/.well-known/jwks.json").get_json() == {"keys": []}  # HS256 default
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    key_path = tmp_path / "jwt.pem"
+    key_path.write_bytes(
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    )
+    client.application.config.update(JWT_ALGORITHM="RS256", JWT_PRIVATE_KEY_PATH=str(key_path))
+
+    token = client.post("/login", json={"username": "alice", "password": "password123"}).get_json()["token"]
+    res = client.get("/.well-known/jwks.json")
+    assert "max-age=300" in res.headers["Cache-Control"]
+    [jwk] = res.get_json()["keys"]
+    assert jwt.get_unverified_header(token)["kid"] == jwk["kid"]
+    assert jwk["alg"] == "RS256" and "d" not in jwk
+
+    claims = jwt.decode(token, jwt.PyJWK(jwk).key, algorithms=["RS256"])
+    assert claims["username"] == "alice"
+    assert client.get("/me", headers={"Authorization": f"Bearer {token}"}).get_json()["username"] == "alice"
+
+
+def test_retired_keys_verify_under_their_configured_kid(client, tmp_path):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    paths = []
+    for name in ("old", "new"):
+        path = tmp_path / f"{name}.pem"
+        path.write_bytes(
+            ed25519.Ed25519PrivateKey.generate().private_bytes(
+                serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+            )
+        )
+        paths.append(str(path))
+    old, new = paths
+    client.application.config.update(JWT_ALGORITHM="EdDSA", JWT_PRIVATE_KEY_PATH=old, JWT_KEY_ID="2024-01")
+    token = client.post("/login", json={"username": "alice", "password": "password123"}).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # rotated out under its thumbprint, the old key no longer matches the token's kid
+    client.application.config.update(JWT_PRIVATE_KEY_PATH=new, JWT_KEY_ID=None, JWT_VERIFY_KEY_PATHS=old)
+    assert client.get("/me", headers=headers).status_code == 401
+
+    client.application.config.update(JWT_VERIFY_KEY_PATHS=f"2024-01={old}")
+    assert client.get("/me", headers=headers).get_json()["username"] == "alice"
+    kids = [key["kid"] for key in client.get("/.well-known/jwks.json").get_json()["keys"]]
+    assert len(kids) == 2 and kids[1] == "2024-01"
+
+
+def test_refresh_tokens_rotate_and_detect_reuse(client):
+    import sqlite3
+
+    login = client.post("/login", json={"username": "alice", "password": "password123"}).get_json()
+    first = login["refresh_token"]
+    assert login["expires_in"] == 30 * 60
+
+    db = sqlite3.connect(client.application.config["DATABASE_PATH"])
+    stored = [row[0] for row in db.execute("SELECT token_hash FROM refresh_tokens")]
+    assert len(stored) == 1 and first.encode() not in stored[0]
+
+    res = client.post("/token/refresh", json={"refresh_token": first})
+    assert res.status_code == 200
+    second = res.get_json()["refresh_token"]
+    assert second != first
+    token = res.get_json()["token"]
+    assert client.get("/me", headers={"Authorization": f"Bearer {token}"}).get_json()["username"] == "alice"
+
+    # replaying the rotated token revokes the whole chain, including its successor
+    assert client.post("/token/refresh", json={"refresh_token": first}).status_code == 401
+    assert client.post("/token/refresh", json={"refresh_token": second}).status_code == 401
+
+    third = client.post("/login", json={"username": "alice", "password": "password123"}).get_json()["refresh_token"]
+    assert client.post("/token/revoke", json={"refresh_token": third}).status_code == 200
+    assert client.post("/token/refresh", json={"refresh_token": third}).status_code == 401
+    assert client.post("/token/refresh", json={}).status_code == 400
+
+
+def test_login_rehashes_outdated_password_hash(client):
+    import sqlite3
+
+    db = sqlite3.connect(client.application.config["DATABASE_PATH"])
+    client.application.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+
+    res = client.post("/login", json={"username": "alice", "password": "password123"})
+    assert res.status_code == 200
+    stored, version = db.execute("SELECT password_hash, version FROM users WHERE username = 'alice'").fetchone()
+    assert stored.startswith("pbkdf2:sha256:1000$")
+    assert version == 1  # not a credential change: issued tokens stay valid
+    token = res.get_json()["token"]
+    assert client.get("/me", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+    assert client.post("/login", json={"username": "alice", "password": "password123"}).status_code == 200
+    assert db.execute("SELECT password_hash FROM users WHERE username = 'alice'").fetchone()[0] == stored
+    assert client.get("/metrics/hashing").get_json()["latency"]["rehash"]["count"] == 1
+
+
+def test_calibrate_hash_writes_config(tmp_path):
+    import json
+
+    import calibrate_hash
+    from hashing import load_hash_config
+
+    output = tmp_path / "hash_config.json"
+    calibrate_hash.main(["--target-ms", "1", "--samples", "1", "--output", str(output)])
+    result = json.loads(output.read_text())
+    # nothing fits a 1 ms budget, so the cheapest candidate is chosen, but
+    # nothing below werkzeug's default is tried unless asked for
+    assert result["method"] == "pbkdf2:sha256:600000"
+    assert result["candidates"][0]["count"] == 1
+    assert load_hash_config(str(output)) == result["method"]
+
+    calibrate_hash.main(["--target-ms", "1", "--samples", "1", "--min-cost", "1", "--output", str(output)])
+    assert json.loads(output.read_text())["method"] == "pbkdf2:sha256:100000"
+
+
+def test_calibrate_hash_rejects_a_floor_above_every_candidate(tmp_path, capsys):
+    import pytest
+
+    import calibrate_hash
+
+    output = tmp_path / "hash_config.json"
+    with pytest.raises(SystemExit) as exited:
+        calibrate_hash.main(["--min-cost", str(10**9), "--output", str(output)])
+    assert exited.value.code == 2
+    assert "no pbkdf2 cost to try is at least 1000000000" in capsys.readouterr().err
+    assert not output.exists()
+
+
+def test_hash_timeout_is_503_and_keeps_its_slot(client):
+    import time
+
+    import pytest
+
+    import app as auth_app
+    from hashing import HashPoolFull, HashTimeout
+
+    client.application.config.update(HASH_WORKERS=1, HASH_QUEUE_DEPTH=0, HASH_TIMEOUT=0.001, HASH_RETRY_AFTER=3)
+    pool = auth_app.get_hash_pool()
+    res = client.post("/login", json={"username": "alice", "password": "password123"})
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "3"
+
+    pool.timeout = 0.05
+    while pool.stats()["in_flight"]:
+        time.sleep(0.01)
+    with pytest.raises(HashTimeout):
+        pool.submit("sleep", time.sleep, 0.5)
+    # the abandoned hash is still running, so it still counts against the bound
+    assert pool.stats()["in_flight"] == 1
+    with pytest.raises(HashPoolFull) as excinfo:
+        pool.submit("sleep", time.sleep, 0)
+    assert not isinstance(excinfo.value, HashTimeout)
+    while pool.stats()["in_flight"]:
+        time.sleep(0.01)
+    pool.timeout = 5
+    assert pool.submit("sleep", time.sleep, 0) is None
+    assert pool.stats()["timed_out"] == 2
+    pool.close()
@@ -0,0 +1,109 @@
+"""In-memory cache of verified bearer tokens.
+
+``get_current_user()`` used to run ``jwt.decode`` and a users lookup for
+every request, even for the same token seconds apart. Verified tokens are
+now cached by SHA-256 digest (raw tokens are never kept) with their claims
+and user, until the token's ``exp`` or ``max_age``, whichever comes first.
+
+Each entry records the user's version when it was cached. ``bump_user()``
+(called when a verification finds a newer version in the database) makes
+every older entry for that user a miss. ``max_age`` bounds how long a change
+made elsewhere can go unnoticed. The known versions are bounded like the
+entries; an entry whose user's version has been evicted is a miss, so it is
+verified against the database again.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+def token_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class CachedToken:
+    __slots__ = ("claims", "user", "version", "expires_at")
+
+    def __init__(self, claims, user, version, expires_at):
+        self.claims = claims
+        self.user = user
+        self.version = version
+        self.expires_at = expires_at
+
+
+class TokenCache:
+    def __init__(self, max_entries=10000, max_age=60.0, clock=time.time):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._user_versions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, digest):
+        """Return the CachedToken for ``digest`` if it is still valid, else None."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            user_id = entry.user["id"]
+            if now >= entry.expires_at or entry.version != self._user_versions.get(user_id):
+                del self._entries[digest]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self._user_versions.move_to_end(user_id)
+            self.hits += 1
+            return entry
+
+    def put(self, digest, claims, user, version):
+        expires_at = min(float(claims["exp"]), self.clock() + self.max_age)
+        entry = CachedToken(claims, user, version, expires_at)
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            known = self._user_versions.get(user["id"])
+            if known is not None and known > version:
+                return entry  # verified against an older row than we have seen
+            self._set_version(user["id"], version)
+            self._entries[digest] = entry
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def bump_user(self, user_id, version):
+        """Record ``version`` as current for ``user_id``; older entries go stale."""
+        with self._lock:
+            if version > self._user_versions.get(user_id, 0):
+                self._set_version(user_id, version)
+
+    def _set_version(self, user_id, version):
+        # Called with the lock held.
+        self._user_versions[user_id] = version
+        self._user_versions.move_to_end(user_id)
+        while len(self._user_versions) > self.max_entries:
+            self._user_versions.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_versions.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_entries": self.max_entries,
+                "max_age": self.max_age,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+            }
@@ -1,56 +1,396 @@
+import base64
+import binascii
+import hashlib
+import json
 import os
-import sqlite3
-from datetime import datetime
-
-from flask import Flask, jsonify, request
-from sqlite3 import OperationalError
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+import jwt
+from flask import Flask, Response, g, jsonify, request
+
+import migrate
+from compression import Compress
+from db import DeadlineExceeded, GroupCommitWriter, ReadPool
+from fragments import FULL, SUMMARY, FragmentCache, Post, parse_fields
+from jwt_verifier import KeySetUnavailable, TokenVerifier, bearer_token
 
 app = Flask(__name__)
 
 # Configurable paths via env; defaults work for local/dev.
 DEFAULT_DB_PATH = os.getenv("BLOG_DB_PATH") or os.getenv("DATABASE_PATH") or "database.db"
-DEFAULT_SCHEMA_PATH = os.getenv("BLOG_SCHEMA_PATH") or os.path.join(os.path.dirname(__file__), "schema.sql")
+DEFAULT_MIGRATIONS_PATH = os.getenv("BLOG_MIGRATIONS_PATH") or migrate.DEFAULT_MIGRATIONS_PATH
 
 app.config.setdefault("DATABASE_PATH", DEFAULT_DB_PATH)
-app.config.setdefault("SCHEMA_PATH", DEFAULT_SCHEMA_PATH)
+app.config.setdefault("MIGRATIONS_PATH", DEFAULT_MIGRATIONS_PATH)
+app.config.setdefault("DEFAULT_PAGE_SIZE", 20)
+app.config.setdefault("MAX_PAGE_SIZE", 100)
+app.config.setdefault("STREAM_CHUNK_SIZE", 500)
+app.config.setdefault("MAX_BATCH_SIZE", int(os.getenv("MAX_BATCH_SIZE", "5000")))
+app.config.setdefault("READ_POOL_SIZE", int(os.getenv("READ_POOL_SIZE", "8")))
+app.config.setdefault("WRITE_BATCH_MAX", int(os.getenv("WRITE_BATCH_MAX", "64")))
+app.config.setdefault("WRITE_BATCH_WINDOW_MS", float(os.getenv("WRITE_BATCH_WINDOW_MS", "2")))
+# Bodies at least this many UTF-8 bytes long are stored zlib-compressed.
+app.config.setdefault("BODY_COMPRESS_THRESHOLD", int(os.getenv("BODY_COMPRESS_THRESHOLD", "512")))
+app.config.setdefault("FRAGMENT_CACHE_SIZE", int(os.getenv("FRAGMENT_CACHE_SIZE", "10000")))
+# When set (e.g. http://auth-service:5002/.well-known/jwks.json), writes
+# require a bearer token from the auth service, verified in-process.
+app.config.setdefault("AUTH_JWKS_URL", os.getenv("AUTH_JWKS_URL") or None)
+app.config.setdefault("JWKS_CACHE_TTL", float(os.getenv("JWKS_CACHE_TTL", "300")))
+
+# Encoded JSON per post, keyed by id and checked against updated_at.
+fragment_cache = FragmentCache(app.config["FRAGMENT_CACHE_SIZE"])
+
+Compress(app)
+
+
+_db_lock = threading.Lock()
+
+
+def get_writer():
+    """Return the process's writer for the configured DB, starting it on first use."""
+    writer = app.extensions.get("db_writer")
+    if writer is None or writer.db_path != app.config["DATABASE_PATH"]:
+        with _db_lock:
+            writer = app.extensions.get("db_writer")
+            if writer is None or writer.db_path != app.config["DATABASE_PATH"]:
+                writer = GroupCommitWriter(
+                    app.config["DATABASE_PATH"],
+                    max_batch=app.config["WRITE_BATCH_MAX"],
+                    max_delay=app.config["WRITE_BATCH_WINDOW_MS"] / 1000.0,
+                )
+                app.extensions["db_writer"] = writer
+    return writer
+
+
+def get_read_pool():
+    pool = app.extensions.get("db_read_pool")
+    if pool is None or pool.db_path != app.config["DATABASE_PATH"]:
+        get_writer()  # the writer switches the file to WAL before readers attach
+        with _db_lock:
+            pool = app.extensions.get("db_read_pool")
+            if pool is None or pool.db_path != app.config["DATABASE_PATH"]:
+                pool = ReadPool(app.config["DATABASE_PATH"], max_size=app.config["READ_POOL_SIZE"])
+                app.extensions["db_read_pool"] = pool
+    return pool
+
+
+def get_verifier():
+    verifier = app.extensions.get("jwt_verifier")
+    if verifier is None or verifier.jwks_url != app.config["AUTH_JWKS_URL"]:
+        with _db_lock:
+            verifier = app.extensions.get("jwt_verifier")
+            if verifier is None or verifier.jwks_url != app.config["AUTH_JWKS_URL"]:
+                verifier = TokenVerifier(app.config["AUTH_JWKS_URL"], ttl=app.config["JWKS_CACHE_TTL"])
+                app.extensions["jwt_verifier"] = verifier
+    return verifier
+
+
+def require_token(view):
+    """Require a valid auth-service bearer token when AUTH_JWKS_URL is configured.
+
+    The verified claims are left in ``g.token_claims``.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not app.config["AUTH_JWKS_URL"]:
+            return view(*args, **kwargs)
+        token = bearer_token(request.headers.get("Authorization"))
+        if token is None:
+            return unauthorized("Bearer token required")
+        try:
+            g.token_claims = get_verifier().verify(token)
+        except KeySetUnavailable:
+            return jsonify({"error": "Token keys unavailable"}), 503
+        except jwt.InvalidTokenError:
+            return unauthorized("Invalid token")
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def unauthorized(message):
+    resp = jsonify({"error": message})
+    resp.headers["WWW-Authenticate"] = "Bearer"
+    return resp, 401
 
 
 def get_db_connection():
-    """Return a SQLite connection using the configured DB path."""
-    conn = sqlite3.connect(app.config["DATABASE_PATH"])
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Return a pooled, read-only SQLite connection; ``close()`` returns it to the pool.
+
+    All writes go through ``get_writer()``.
+    """
+    return get_read_pool().acquire(deadline=request_deadline())
+
+
+@contextmanager
+def read_connection():
+    """A pooled read connection that goes back to the pool however the block exits."""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
 
 
 def row_to_post(row):
-    return {
+    post = {
         "id": row["id"],
         "title": row["title"],
-        "content": row["content"],
         "created": row["created"],
     }
+    keys = row.keys()
+    if "updated_at" in keys:
+        post["updated_at"] = row["updated_at"]
+    # List queries leave the body out; only single-post reads decompress it.
+    if "body" in keys:
+        post["content"] = unpack_body(row["compressed"], row["body"])
+    return post
+
+
+def post_query(shape):
+    """Return ``SELECT ... FROM`` for posts projected to ``shape``.
+
+    id, created and updated_at are always read: they drive cursors and
+    fragment versions, and sit in the list index next to title. The body is
+    only joined (and decompressed) when ``content`` is asked for.
+    """
+    title = "posts.title" if "title" in shape else "NULL"
+    if "content" in shape:
+        return (
+            f"SELECT posts.id, {title}, posts.created, posts.updated_at, post_bodies.compressed, post_bodies.body"
+            " FROM posts LEFT JOIN post_bodies ON post_bodies.post_id = posts.id"
+        )
+    return f"SELECT posts.id, {title}, posts.created, posts.updated_at FROM posts"
+
+
+def post_factory(cursor, row):
+    if len(row) > 4:
+        return Post(row[0], row[1], row[2], row[3], unpack_body(row[4], row[5]))
+    return Post(*row)
+
+
+def select_posts(conn, sql, params=()):
+    """Run a ``post_query()`` into Post objects.
+
+    Rows come back as plain tuples; building a sqlite3.Row and then a dict
+    per post was most of the cost of a listing.
+    """
+    cur = conn.cursor()
+    cur.row_factory = post_factory
+    return cur.execute(sql, params).fetchall()
 
 
-def ensure_schema():
-    """Create schema if the posts table is missing (helps local/dev without entrypoint)."""
-    conn = get_db_connection()
+def requested_shape(default):
+    """Return ``(shape, error_response)`` for the request's ``?fields=``."""
+    fields = request.args.get("fields")
+    if fields is None:
+        return default, None
     try:
-        conn.execute("SELECT 1 FROM posts LIMIT 1;")
-    except OperationalError:
-        with open(app.config["SCHEMA_PATH"], "r") as f:
-            conn.executescript(f.read())
-        conn.commit()
-    finally:
-        conn.close()
+        return parse_fields(fields), None
+    except ValueError as exc:
+        return None, (jsonify({"error": str(exc)}), 400)
 
 
-def get_post_or_404(post_id):
-    conn = get_db_connection()
-    post = conn.execute("SELECT * FROM posts WHERE id = ?", (post_id,)).fetchone()
-    conn.close()
-    if post is None:
+def json_response(data, status=200):
+    """Wrap already-encoded JSON bytes in a response."""
+    return Response(data, status=status, mimetype="application/json")
+
+
+def pack_body(content):
+    """Return ``(compressed, body)`` for a post_bodies row."""
+    raw = content.encode("utf-8")
+    if len(raw) >= app.config["BODY_COMPRESS_THRESHOLD"]:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return 1, packed
+    return 0, content
+
+
+def unpack_body(compressed, body):
+    if body is None:
+        return ""
+    if compressed:
+        return zlib.decompress(body).decode("utf-8")
+    return body
+
+
+def fetch_post(conn, post_id):
+    return conn.execute(
+        "SELECT posts.id, posts.title, posts.created, posts.updated_at, post_bodies.compressed, post_bodies.body"
+        " FROM posts LEFT JOIN post_bodies ON post_bodies.post_id = posts.id WHERE posts.id = ?",
+        (post_id,),
+    ).fetchone()
+
+
+def insert_post(conn, title, content, created=None):
+    """Insert a post with its body and search entry; the caller commits."""
+    created = created or datetime.utcnow()
+    cur = conn.execute(
+        "INSERT INTO posts (title, created, updated_at) VALUES (?, ?, ?)",
+        (title, created, created),
+    )
+    conn.execute(
+        "INSERT INTO post_bodies (post_id, compressed, body) VALUES (?, ?, ?)",
+        (cur.lastrowid, *pack_body(content)),
+    )
+    conn.execute("INSERT INTO posts_fts (rowid, title, content) VALUES (?, ?, ?)", (cur.lastrowid, title, content))
+    return cur.lastrowid
+
+
+def unindex_post(conn, post):
+    # posts_fts is contentless: removing an entry means restating its text.
+    conn.execute(
+        "INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', ?, ?, ?)",
+        (post["id"], post["title"], post["content"]),
+    )
+
+
+_migrated_paths = set()
+_migrate_lock = threading.Lock()
+
+
+@app.before_request
+def ensure_migrated():
+    """Apply pending migrations once per process and database.
+
+    The entrypoint migrates at container start; this covers local runs and
+    tests. After the first request it is a set lookup, not a schema probe.
+    """
+    db_path = app.config["DATABASE_PATH"]
+    if db_path in _migrated_paths:
+        return
+    with _migrate_lock:
+        if db_path not in _migrated_paths:
+            migrate.apply_migrations(db_path, app.config["MIGRATIONS_PATH"])
+            _migrated_paths.add(db_path)
+
+
+# Milliseconds the caller is still prepared to wait for this response.
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+
+@app.before_request
+def read_deadline():
+    """Adopt the caller's deadline budget, if it sent one.
+
+    A request that arrives with no budget left is refused straight away, and
+    reads and writes that cannot start before the deadline are abandoned
+    (see db.py); nobody is waiting for their result any more.
+    """
+    try:
+        budget_ms = float(request.headers[DEADLINE_HEADER])
+    except (KeyError, ValueError):
+        return None
+    g.deadline = time.monotonic() + budget_ms / 1000.0
+    if budget_ms <= 0:
+        return deadline_exceeded(None)
+    return None
+
+
+def request_deadline():
+    return g.get("deadline")
+
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(exc):
+    return jsonify({"error": "Deadline exceeded"}), 504
+
+
+def get_page_size():
+    limit = request.args.get("limit", type=int) or app.config["DEFAULT_PAGE_SIZE"]
+    return max(1, min(limit, app.config["MAX_PAGE_SIZE"]))
+
+
+def encode_cursor(post):
+    raw = f"{post.created}|{post.id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the ``(created, id)`` key in an opaque cursor, or None if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created, _, post_id = base64.urlsafe_b64decode(padded).decode("utf-8").rpartition("|")
+        return created, int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def fts_query(text):
+    """Quote each search term so user input is never parsed as FTS5 syntax.
+
+    NULs are dropped (FTS5 would end the string there); text with no terms
+    left becomes ``""``, which matches nothing.
+    """
+    terms = text.replace("\x00", "").split()
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in terms) or '""'
+
+
+def search_posts(text, limit, page, shape=SUMMARY):
+    """Return one page of posts matching ``text``, best bm25 match first (titles weigh more)."""
+    with read_connection() as conn:
+        return select_posts(
+            conn,
+            post_query(shape) + " JOIN posts_fts ON posts_fts.rowid = posts.id"
+            " WHERE posts_fts MATCH ? ORDER BY bm25(posts_fts, 10.0, 1.0) LIMIT ? OFFSET ?",
+            (fts_query(text), limit, (page - 1) * limit),
+        )
+
+
+def parse_timestamp(value):
+    """Parse a stored SQLite timestamp (naive UTC) into an aware datetime."""
+    if value is None:
+        return None
+    return datetime.fromisoformat(str(value)).replace(tzinfo=timezone.utc)
+
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the request's validators still match, else None.
+
+    If-None-Match wins over If-Modified-Since, as RFC 9110 requires.
+    """
+    if request.if_none_match:
+        # Weak comparison, so gzip-weakened ETags still match.
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        matched = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        matched = False
+    if not matched:
         return None
-    return row_to_post(post)
+    resp = Response(status=304)
+    return with_validators(resp, etag, last_modified)
+
+
+def with_validators(resp, etag, last_modified=None):
+    resp.set_etag(etag)
+    if last_modified is not None:
+        # Last-Modified has one-second resolution. A date in the current
+        # second could be followed by another change within that second, and
+        # If-Modified-Since could not tell the two apart, so such responses
+        # carry only the ETag.
+        if last_modified.replace(microsecond=0) < datetime.now(timezone.utc).replace(microsecond=0):
+            resp.last_modified = last_modified
+    return resp
+
+
+def posts_change_state(conn):
+    """Return ``(version, changed_at)`` of the posts table's change counter."""
+    row = conn.execute("SELECT version, changed_at FROM change_counters WHERE name = 'posts'").fetchone()
+    return row["version"], parse_timestamp(row["changed_at"])
+
+
+def listing_etag(version, variant):
+    """ETag for a listing: the table version plus everything that shapes the body."""
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    digest = hashlib.sha1(f"{variant}?{args}".encode("utf-8")).hexdigest()[:16]
+    return f"l{version}-{digest}"
 
 
 @app.route("/health", methods=["GET"])
@@ -58,22 +398,150 @@ def health():
     return jsonify({"status": "ok"}), 200
 
 
+@app.route("/metrics/db", methods=["GET"])
+def db_stats():
+    return jsonify({"read_pool": get_read_pool().stats(), "writer": get_writer().stats()}), 200
+
+
+@app.route("/metrics/fragment-cache", methods=["GET"])
+def fragment_cache_stats():
+    return jsonify(fragment_cache.stats()), 200
+
+
+def wants_stream():
+    if request.args.get("stream") in ("1", "true"):
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+
+def stream_posts(key, limit, chunk_size, shape=FULL):
+    """Yield posts (with content by default) as NDJSON, newest first, ``chunk_size`` rows at a time.
+
+    Only one chunk is in memory at once, so exports stay flat however large
+    the table is. The read connection is taken when the first chunk is
+    wanted and returned when the response is closed, so a HEAD request or a
+    client that leaves early never holds one.
+    """
+    sql = post_query(shape)
+    params = []
+    if key is not None:
+        sql += " WHERE (posts.created, posts.id) < (?, ?)"
+        params.extend(key)
+    sql += " ORDER BY posts.created DESC, posts.id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    conn = get_read_pool().acquire()
+    try:
+        cur = conn.cursor()
+        cur.row_factory = post_factory
+        cur.execute(sql, params)
+        while True:
+            posts = cur.fetchmany(chunk_size)
+            if not posts:
+                break
+            # Exports touch every post once, so they encode directly rather
+            # than churning the fragment cache.
+            yield b"".join(post.to_json(shape) + b"\n" for post in posts)
+    finally:
+        conn.close()
+
+
 @app.route("/posts", methods=["GET"])
 def list_posts():
-    ensure_schema()
-    conn = get_db_connection()
-    posts = conn.execute("SELECT * FROM posts ORDER BY created DESC").fetchall()
-    conn.close()
-    return jsonify([row_to_post(p) for p in posts]), 200
+    cursor = request.args.get("cursor")
+    key = decode_cursor(cursor) if cursor else None
+    if cursor and key is None:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    # Every listing is a function of the table version and the request, so a
+    # client holding the current ETag gets a 304 before any rows are read.
+    # Search results are always a JSON page, whatever was asked for.
+    q = (request.args.get("q") or "").strip()
+    stream = not q and wants_stream()
+    shape, error = requested_shape(FULL if stream else SUMMARY)
+    if error:
+        return error
+    with read_connection() as conn:
+        version, changed_at = posts_change_state(conn)
+    etag = listing_etag(version, "ndjson" if stream else "json")
+    cached = not_modified(etag, changed_at)
+    if cached is not None:
+        return cached
+
+    if q:
+        page = max(1, request.args.get("page", 1, type=int))
+        resp = json_response(fragment_cache.encode_list(search_posts(q, get_page_size(), page, shape), shape))
+        return with_validators(resp, etag, changed_at)
+
+    if stream:
+        # Export mode: the whole listing (or ?limit= rows) after the cursor.
+        limit = request.args.get("limit", type=int)
+        body = stream_posts(key, limit, app.config["STREAM_CHUNK_SIZE"], shape)
+        resp = Response(body, mimetype="application/x-ndjson")
+        resp.vary.add("Accept")
+        return with_validators(resp, etag, changed_at)
+
+    # Keyset pagination: each page is an index range scan starting after the
+    # (created, id) key of the previous page's last row.
+    limit = get_page_size()
+    with read_connection() as conn:
+        if key is not None:
+            posts = select_posts(
+                conn,
+                post_query(shape) + " WHERE (posts.created, posts.id) < (?, ?)"
+                " ORDER BY posts.created DESC, posts.id DESC LIMIT ?",
+                (*key, limit + 1),
+            )
+        else:
+            posts = select_posts(
+                conn,
+                post_query(shape) + " ORDER BY posts.created DESC, posts.id DESC LIMIT ?",
+                (limit + 1,),
+            )
+
+    # The body is spliced from each post's cached JSON; only posts that are
+    # new or changed since they were last listed get encoded.
+    resp = json_response(fragment_cache.encode_list(posts[:limit], shape))
+    resp.vary.add("Accept")
+    with_validators(resp, etag, changed_at)
+    if len(posts) > limit:
+        next_cursor = encode_cursor(posts[limit - 1])
+        resp.headers["X-Next-Cursor"] = next_cursor
+        fields = f"&fields={','.join(shape)}" if "fields" in request.args else ""
+        resp.headers["Link"] = f'<{request.base_url}?limit={limit}&cursor={next_cursor}{fields}>; rel="next"'
+    return resp
 
 
 @app.route("/posts/<int:post_id>", methods=["GET"])
 def get_post(post_id):
-    ensure_schema()
-    post = get_post_or_404(post_id)
-    if not post:
+    shape, error = requested_shape(FULL)
+    if error:
+        return error
+    with read_connection() as conn:
+        meta = conn.execute("SELECT updated_at FROM posts WHERE id = ?", (post_id,)).fetchone()
+    if meta is None:
         return jsonify({"error": "Post not found"}), 404
-    return jsonify(post), 200
+
+    # Validators come from the narrow posts row; the body is only read and
+    # decompressed when the client's copy is stale.
+    etag = f"p{post_id}-{meta['updated_at']}".replace(" ", "T")
+    if shape != FULL:
+        etag += "-" + ".".join(shape)
+    last_modified = parse_timestamp(meta["updated_at"])
+    cached = not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+
+    data = fragment_cache.get(post_id, shape, meta["updated_at"])
+    if data is None:
+        with read_connection() as conn:
+            posts = select_posts(conn, post_query(shape) + " WHERE posts.id = ?", (post_id,))
+        if not posts:
+            return jsonify({"error": "Post not found"}), 404
+        data = fragment_cache.put(posts[0], shape)
+    return with_validators(json_response(data), etag, last_modified)
 
 
 def validate_post_payload(data):
@@ -89,61 +557,273 @@ def validate_post_payload(data):
 
 
 @app.route("/posts", methods=["POST"])
+@require_token
 def create_post():
-    ensure_schema()
     ok, result = validate_post_payload(request.get_json(silent=True))
     if not ok:
         return jsonify({"error": result}), 400
 
     payload = result
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO posts (title, content, created) VALUES (?, ?, ?)",
-        (payload["title"], payload["content"], datetime.utcnow()),
-    )
-    conn.commit()
-    new_id = cur.lastrowid
-    post = conn.execute("SELECT * FROM posts WHERE id = ?", (new_id,)).fetchone()
-    conn.close()
-    return jsonify(row_to_post(post)), 201
+    post = get_writer().run(write_new_post, payload, deadline=request_deadline())
+    return jsonify(post), 201
 
 
 @app.route("/posts/<int:post_id>", methods=["PUT", "PATCH"])
+@require_token
 def update_post(post_id):
-    ensure_schema()
-    existing = get_post_or_404(post_id)
-    if not existing:
-        return jsonify({"error": "Post not found"}), 404
-
     ok, result = validate_post_payload(request.get_json(silent=True))
     if not ok:
         return jsonify({"error": result}), 400
 
-    payload = result
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE posts SET title = ?, content = ? WHERE id = ?",
-        (payload["title"], payload["content"], post_id),
-    )
-    conn.commit()
-    updated = conn.execute("SELECT * FROM posts WHERE id = ?", (post_id,)).fetchone()
-    conn.close()
-    return jsonify(row_to_post(updated)), 200
+    updated = get_writer().run(write_post_update, post_id, result, deadline=request_deadline())
+    fragment_cache.evict([post_id])
+    if updated is None:
+        return jsonify({"error": "Post not found"}), 404
+    return jsonify(updated), 200
 
 
 @app.route("/posts/<int:post_id>", methods=["DELETE"])
+@require_token
 def delete_post(post_id):
-    ensure_schema()
-    existing = get_post_or_404(post_id)
-    if not existing:
+    existing = get_writer().run(write_post_delete, post_id, deadline=request_deadline())
+    fragment_cache.evict([post_id])
+    if existing is None:
         return jsonify({"error": "Post not found"}), 404
+    return jsonify({"message": f'Post "{existing["title"]}" deleted', "id": post_id, "title": existing["title"]}), 200
 
-    conn = get_db_connection()
+
+# Mutations below run on the writer thread inside its group transaction;
+# they must not touch the request and must return plain data.
+
+
+def write_new_post(conn, payload):
+    return row_to_post(fetch_post(conn, insert_post(conn, payload["title"], payload["content"])))
+
+
+def write_post_update(conn, post_id, payload):
+    existing = fetch_post(conn, post_id)
+    if existing is None:
+        return None
+    conn.execute(
+        "UPDATE posts SET title = ?, updated_at = ? WHERE id = ?",
+        (payload["title"], datetime.utcnow(), post_id),
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO post_bodies (post_id, compressed, body) VALUES (?, ?, ?)",
+        (post_id, *pack_body(payload["content"])),
+    )
+    unindex_post(conn, row_to_post(existing))
+    conn.execute(
+        "INSERT INTO posts_fts (rowid, title, content) VALUES (?, ?, ?)",
+        (post_id, payload["title"], payload["content"]),
+    )
+    return row_to_post(fetch_post(conn, post_id))
+
+
+def write_post_delete(conn, post_id):
+    existing = fetch_post(conn, post_id)
+    if existing is None:
+        return None
+    existing = row_to_post(existing)
+    conn.execute("DELETE FROM post_bodies WHERE post_id = ?", (post_id,))
     conn.execute("DELETE FROM posts WHERE id = ?", (post_id,))
-    conn.commit()
-    conn.close()
-    return jsonify({"message": f'Post "{existing["title"]}" deleted'}), 200
+    unindex_post(conn, existing)
+    return existing
+
+
+def parse_batch_body():
+    """Return the items of a JSON-array or NDJSON request body, or None.
+
+    Unparseable NDJSON lines are kept as ``None`` so they are reported
+    against their own index instead of failing the whole batch.
+    """
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        items = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+    data = request.get_json(silent=True)
+    return data if isinstance(data, list) else None
+
+
+def batch_items_or_error():
+    items = parse_batch_body()
+    if items is None:
+        return None, (jsonify({"error": "Expected a JSON array or NDJSON body"}), 400)
+    if len(items) > app.config["MAX_BATCH_SIZE"]:
+        return None, (jsonify({"error": f'Batch exceeds {app.config["MAX_BATCH_SIZE"]} items'}), 413)
+    return items, None
+
+
+def batch_response(results, ok_status):
+    """Per-item results; 207 Multi-Status when only some items succeeded."""
+    failed = sum(1 for r in results if r["status"] >= 400)
+    body = {"results": results, "succeeded": len(results) - failed, "failed": failed}
+    return jsonify(body), ok_status if not failed else 207
+
+
+def fetch_posts_by_id(conn, post_ids):
+    """Return ``{id: post}`` (with content) for the given ids."""
+    found = {}
+    ids = list(set(post_ids))
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        rows = conn.execute(
+            "SELECT posts.id, posts.title, posts.created, posts.updated_at, post_bodies.compressed, post_bodies.body"
+            " FROM posts LEFT JOIN post_bodies ON post_bodies.post_id = posts.id"
+            f" WHERE posts.id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ).fetchall()
+        found.update((row["id"], row_to_post(row)) for row in rows)
+    return found
+
+
+def item_post_id(item):
+    post_id = item.get("id") if isinstance(item, dict) else item
+    return post_id if isinstance(post_id, int) and not isinstance(post_id, bool) else None
+
+
+@app.route("/posts:batch", methods=["POST"])
+@require_token
+def create_posts_batch():
+    """Create many posts in one transaction (JSON array or NDJSON body)."""
+    items, error = batch_items_or_error()
+    if error:
+        return error
+
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        ok, result = validate_post_payload(item)
+        if ok:
+            valid.append((index, result))
+        else:
+            results[index] = {"index": index, "status": 400, "error": result}
+
+    created = datetime.utcnow()
+
+    def apply(conn):
+        # Ids are needed for the body and search rows, so posts go in one
+        # statement at a time; everything else is executemany. The whole
+        # batch is one mutation in the writer's group commit.
+        ids = [
+            conn.execute(
+                "INSERT INTO posts (title, created, updated_at) VALUES (?, ?, ?)",
+                (payload["title"], created, created),
+            ).lastrowid
+            for _, payload in valid
+        ]
+        conn.executemany(
+            "INSERT INTO post_bodies (post_id, compressed, body) VALUES (?, ?, ?)",
+            [(post_id, *pack_body(payload["content"])) for post_id, (_, payload) in zip(ids, valid)],
+        )
+        conn.executemany(
+            "INSERT INTO posts_fts (rowid, title, content) VALUES (?, ?, ?)",
+            [(post_id, payload["title"], payload["content"]) for post_id, (_, payload) in zip(ids, valid)],
+        )
+        return ids
+
+    ids = get_writer().run(apply, deadline=request_deadline())
+    for post_id, (index, payload) in zip(ids, valid):
+        post = {
+            "id": post_id,
+            "title": payload["title"],
+            "created": str(created),
+            "updated_at": str(created),
+            "content": payload["content"],
+        }
+        results[index] = {"index": index, "status": 201, "post": post}
+    return batch_response(results, 201)
+
+
+@app.route("/posts:batch", methods=["PUT", "PATCH"])
+@require_token
+def update_posts_batch():
+    """Update many posts in one transaction; each item carries its ``id``."""
+    items, error = batch_items_or_error()
+    if error:
+        return error
+
+    results = [None] * len(items)
+    valid = []
+    updated_at = datetime.utcnow()
+    for index, item in enumerate(items):
+        post_id = item_post_id(item)
+        ok, result = validate_post_payload(item)
+        if post_id is None:
+            results[index] = {"index": index, "status": 400, "error": "Post id is required"}
+        elif not ok:
+            results[index] = {"index": index, "status": 400, "error": result}
+        else:
+            valid.append((index, post_id, result))
+
+    def apply(conn):
+        current = fetch_posts_by_id(conn, [post_id for _, post_id, _ in valid])
+        titles, bodies, unindex, reindex = [], [], [], []
+        for index, post_id, payload in valid:
+            existing = current.get(post_id)
+            if existing is None:
+                results[index] = {"index": index, "status": 404, "error": "Post not found"}
+                continue
+            titles.append((payload["title"], updated_at, post_id))
+            bodies.append((post_id, *pack_body(payload["content"])))
+            unindex.append((post_id, existing["title"], existing["content"]))
+            reindex.append((post_id, payload["title"], payload["content"]))
+            current[post_id] = dict(existing, updated_at=str(updated_at), **payload)
+            results[index] = {"index": index, "status": 200, "post": current[post_id]}
+
+        conn.executemany("UPDATE posts SET title = ?, updated_at = ? WHERE id = ?", titles)
+        conn.executemany("INSERT OR REPLACE INTO post_bodies (post_id, compressed, body) VALUES (?, ?, ?)", bodies)
+        # Apply search-index changes pairwise so an id updated twice in one
+        # batch is removed with exactly the text it was last indexed with.
+        for old, new in zip(unindex, reindex):
+            conn.execute("INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', ?, ?, ?)", old)
+            conn.execute("INSERT INTO posts_fts (rowid, title, content) VALUES (?, ?, ?)", new)
+
+    get_writer().run(apply, deadline=request_deadline())
+    fragment_cache.evict([post_id for _, post_id, _ in valid])
+    return batch_response(results, 200)
+
+
+@app.route("/posts:batch", methods=["DELETE"])
+@require_token
+def delete_posts_batch():
+    """Delete many posts in one transaction; items are ids or ``{"id": ...}``."""
+    items, error = batch_items_or_error()
+    if error:
+        return error
+
+    results = [None] * len(items)
+
+    def apply(conn):
+        current = fetch_posts_by_id(conn, [pid for pid in map(item_post_id, items) if pid is not None])
+        doomed = []
+        for index, item in enumerate(items):
+            post_id = item_post_id(item)
+            existing = current.pop(post_id, None) if post_id is not None else None
+            if post_id is None:
+                results[index] = {"index": index, "status": 400, "error": "Post id is required"}
+            elif existing is None:
+                results[index] = {"index": index, "status": 404, "error": "Post not found"}
+            else:
+                doomed.append(existing)
+                results[index] = {"index": index, "status": 200, "message": f'Post "{existing["title"]}" deleted'}
+
+        conn.executemany("DELETE FROM post_bodies WHERE post_id = ?", [(p["id"],) for p in doomed])
+        conn.executemany("DELETE FROM posts WHERE id = ?", [(p["id"],) for p in doomed])
+        conn.executemany(
+            "INSERT INTO posts_fts (posts_fts, rowid, title, content) VALUES ('delete', ?, ?, ?)",
+            [(p["id"], p["title"], p["content"]) for p in doomed],
+        )
+
+    get_writer().run(apply, deadline=request_deadline())
+    fragment_cache.evict([post_id for post_id in map(item_post_id, items) if post_id is not None])
+    return batch_response(results, 200)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,94 @@
+"""gzip response compression for the services' Flask apps.
+
+Each service image is built from its own directory, so this module is
+copied verbatim into blog-api, auth and frontend (like migrate.py); keep the
+copies identical. Usage::
+
+    from compression import Compress
+    Compress(app)
+
+Responses are compressed when the client sends ``Accept-Encoding: gzip``,
+the mimetype is textual, and the body is at least ``COMPRESS_MIN_SIZE``
+bytes (tiny bodies grow under gzip). Streamed responses are compressed chunk
+by chunk with a sync flush, so they still arrive incrementally.
+"""
+import gzip
+import os
+import zlib
+
+COMPRESSIBLE_MIMETYPES = frozenset(
+    {
+        "application/json",
+        "application/x-ndjson",
+        "application/javascript",
+        "application/xml",
+        "image/svg+xml",
+    }
+)
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def gzip_stream(chunks, level):
+    """Gzip an iterable of byte chunks, flushing after each so streaming survives."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+class Compress:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESS_MIN_SIZE", int(os.getenv("COMPRESS_MIN_SIZE", "500")))
+        app.config.setdefault("COMPRESS_LEVEL", int(os.getenv("COMPRESS_LEVEL", "6")))
+        app.extensions["compress"] = self
+        app.after_request(self.after_request)
+
+    def after_request(self, response):
+        from flask import current_app, request
+
+        if not is_compressible(response.mimetype):
+            return response
+        response.vary.add("Accept-Encoding")
+        if (
+            request.method == "HEAD"
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or request.accept_encodings["gzip"] <= 0
+        ):
+            return response
+
+        level = current_app.config["COMPRESS_LEVEL"]
+        if response.is_streamed:
+            response.response = gzip_stream(response.response, level)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < current_app.config["COMPRESS_MIN_SIZE"]:
+                return response
+            packed = gzip.compress(data, compresslevel=level, mtime=0)
+            if len(packed) >= len(data):
+                return response
+            response.set_data(packed)
+
+        response.headers["Content-Encoding"] = "gzip"
+        # The gzip bytes differ from the identity ones, but they are
+        # semantically equivalent: keep validators usable via weak comparison.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,247 @@
+"""SQLite access for the blog API: pooled readers and a single group-committing writer.
+
+SQLite allows one writer at a time. Instead of every request opening its own
+connection and racing for the write lock, all mutations are queued to one
+writer thread that owns the only write connection. It drains whatever has
+queued up (waiting at most ``max_delay`` for more), runs each mutation in its
+own savepoint, and commits the whole group at once, so N concurrent writes
+cost one fsync instead of N and never see "database is locked".
+
+Reads use a bounded pool of ``query_only`` connections; under WAL they never
+block on, or are blocked by, the writer.
+
+Both take an optional ``deadline`` (a ``time.monotonic()`` value). A reader
+waits for a free connection only until then. A write still queued at its
+deadline is dropped without running. Either way ``DeadlineExceeded`` is
+raised, and a write that raised it is known not to have been applied.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+BUSY_TIMEOUT_MS = 5000
+CACHE_SIZE_KB = 8192
+
+
+def tune_connection(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS:d}")
+    conn.execute(f"PRAGMA cache_size={-CACHE_SIZE_KB:d}")
+    return conn
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a caller's deadline passes before its read or write could start."""
+
+
+class PooledConnection(sqlite3.Connection):
+    """A connection whose ``close()`` hands it back to its pool."""
+
+    pool = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def really_close(self):
+        super().close()
+
+
+class ReadPool:
+    """A bounded pool of read-only connections."""
+
+    def __init__(self, db_path, max_size=8, timeout=10.0):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._hits = 0
+        self._misses = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        tune_connection(conn)
+        conn.execute("PRAGMA query_only=ON")
+        conn.pool = self
+        return conn
+
+    def acquire(self, deadline=None):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        else:
+            with self._lock:
+                self._hits += 1
+            return conn
+
+        with self._lock:
+            can_create = self._created < self.max_size
+            if can_create:
+                self._created += 1
+                self._misses += 1
+        if can_create:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        timeout = self.timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise DeadlineExceeded("read")
+        started = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            if timeout < self.timeout:
+                raise DeadlineExceeded("read")
+            raise RuntimeError(f"no read connection available after {self.timeout}s")
+        with self._lock:
+            self._waits += 1
+            self._wait_time += time.perf_counter() - started
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "open": self._created,
+                "idle": self._idle.qsize(),
+                "hits": self._hits,
+                "misses": self._misses,
+                "waits": self._waits,
+                "wait_time_total": round(self._wait_time, 6),
+            }
+
+
+class GroupCommitWriter:
+    """Serialize all writes through one thread and commit them in groups.
+
+    ``submit(fn, *args)`` queues ``fn(conn, *args)`` and returns a Future
+    that resolves with its return value (or exception) once the group it
+    ran in has committed. A failing mutation is rolled back to its own
+    savepoint without affecting the rest of its group.
+    """
+
+    def __init__(self, db_path, max_batch=64, max_delay=0.002):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._groups = 0
+        self._writes = 0
+        self._largest_group = 0
+        self._expired = 0
+        # Open (and switch to WAL) before any reader connects.
+        self._conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        tune_connection(self._conn)
+        self._thread = threading.Thread(target=self._run, name="blog-api-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, deadline=None):
+        future = Future()
+        self._queue.put((fn, args, future, deadline))
+        return future
+
+    def run(self, fn, *args, timeout=None, deadline=None):
+        return self.submit(fn, *args, deadline=deadline).result(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._conn.close()
+
+    def _next_group(self, first):
+        group = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(group) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            group.append(item)
+        return group
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            self._commit_group(self._next_group(first))
+
+    def _commit_group(self, group):
+        conn = self._conn
+        outcomes = []
+        expired = 0
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future, deadline in group:
+                if deadline is not None and deadline <= time.monotonic():
+                    outcomes.append((future, None, DeadlineExceeded("write")))
+                    expired += 1
+                    continue
+                conn.execute("SAVEPOINT write")
+                try:
+                    result = fn(conn, *args)
+                except Exception as exc:
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                    outcomes.append((future, None, exc))
+                else:
+                    conn.execute("RELEASE write")
+                    outcomes.append((future, result, None))
+            conn.execute("COMMIT")
+        except Exception as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, _, future, _ in group:
+                future.set_exception(exc)
+            return
+
+        with self._lock:
+            self._groups += 1
+            self._writes += len(group) - expired
+            self._largest_group = max(self._largest_group, len(group))
+            self._expired += expired
+        # Only acknowledge writes once they are committed.
+        for future, result, exc in outcomes:
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "groups": self._groups,
+                "writes": self._writes,
+                "largest_group": self._largest_group,
+                "expired": self._expired,
+                "avg_group": round(self._writes / self._groups, 3) if self._groups else 0.0,
+            }
@@ -0,0 +1,150 @@
+"""Compact post rows and a cache of their pre-encoded JSON.
+
+List endpoints used to build a dict per ``sqlite3.Row`` and re-encode the
+whole list on every request. Rows are now read as plain tuples into slotted
+``Post`` objects, each post's JSON is encoded once per version and cached,
+and list bodies are spliced together from the cached fragments.
+
+A *shape* is the tuple of fields a response carries (see ``?fields=``); the
+same post is cached once per shape it has been requested in.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+FIELDS = ("id", "title", "created", "updated_at", "content")
+SUMMARY = FIELDS[:4]
+FULL = FIELDS
+
+_encoder = json.JSONEncoder(separators=(",", ":"))
+_quote = json.encoder.encode_basestring_ascii
+_keys = {name: f'"{name}":' for name in FIELDS}
+
+
+def _json_value(value):
+    # Posts are a handful of flat scalars, so quoting them directly is
+    # several times cheaper than a json.dumps() call per post.
+    if isinstance(value, str):
+        return _quote(value)
+    if value is None:
+        return "null"
+    if type(value) is int:
+        return str(value)
+    return _encoder.encode(value)
+
+
+def parse_fields(value):
+    """Return the shape named by a ``fields=a,b`` parameter, in canonical order.
+
+    Raises ValueError naming any unknown field.
+    """
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = requested.difference(FIELDS)
+    if unknown:
+        raise ValueError("Unknown fields: " + ", ".join(sorted(unknown)))
+    if not requested:
+        raise ValueError("No fields requested")
+    return tuple(name for name in FIELDS if name in requested)
+
+
+class Post:
+    """A post row. ``content`` is None for list (summary) rows."""
+
+    __slots__ = FIELDS
+
+    def __init__(self, id, title, created, updated_at=None, content=None):
+        self.id = id
+        self.title = title
+        self.created = created
+        self.updated_at = updated_at
+        self.content = content
+
+    @property
+    def shape(self):
+        return SUMMARY if self.content is None else FULL
+
+    def to_dict(self, shape=None):
+        return {name: getattr(self, name) for name in shape or self.shape}
+
+    def to_json(self, shape=None):
+        parts = [_keys[name] + _json_value(getattr(self, name)) for name in shape or self.shape]
+        return ("{" + ",".join(parts) + "}").encode("ascii")
+
+
+class FragmentCache:
+    """LRU of encoded post JSON keyed by ``(id, shape)`` and checked against the version.
+
+    A post's version is its ``updated_at``; an entry encoded at an older
+    version is simply a miss. Writers also ``evict()`` the ids they touch.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._shapes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, post_id, shape, version):
+        """Return cached bytes for ``post_id`` if they were encoded at ``version``."""
+        key = (post_id, shape)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, post, shape=None):
+        """Encode ``post``, cache the bytes under its current version and return them."""
+        shape = shape or post.shape
+        data = post.to_json(shape)
+        if self.max_entries > 0:
+            key = (post.id, shape)
+            with self._lock:
+                self._entries[key] = (post.updated_at, data)
+                self._entries.move_to_end(key)
+                self._shapes.setdefault(post.id, set()).add(shape)
+                while len(self._entries) > self.max_entries:
+                    self._forget(self._entries.popitem(last=False)[0])
+        return data
+
+    def encode(self, post, shape=None):
+        """Return ``post``'s JSON bytes, from the cache when its version matches."""
+        shape = shape or post.shape
+        return self.get(post.id, shape, post.updated_at) or self.put(post, shape)
+
+    def encode_list(self, posts, shape=None):
+        """Splice cached fragments into a JSON array."""
+        return b"[" + b",".join(self.encode(post, shape) for post in posts) + b"]"
+
+    def _forget(self, key):
+        post_id, shape = key
+        shapes = self._shapes.get(post_id)
+        if shapes is not None:
+            shapes.discard(shape)
+            if not shapes:
+                del self._shapes[post_id]
+
+    def evict(self, post_ids):
+        with self._lock:
+            for post_id in post_ids:
+                for shape in self._shapes.pop(post_id, ()):
+                    self._entries.pop((post_id, shape), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._shapes.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_entries": self.max_entries,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,110 @@
+"""Numbered SQL migrations for the service's SQLite database.
+
+Migrations live in ``migrations/NNNN_description.sql`` and are applied in
+order, recording the version in ``schema_version``. Run at container start
+(``python migrate.py``) and once per process by the app, so requests never
+probe the schema.
+
+The version is read and every pending migration applied in one
+``BEGIN IMMEDIATE`` transaction. Processes starting at the same time
+therefore take turns: the first applies the migrations, and the others find
+them already recorded.
+"""
+import os
+import re
+import sqlite3
+import sys
+
+DEFAULT_MIGRATIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+MIGRATION_FILE_RE = re.compile(r"^(\d+)_[\w-]+\.sql$")
+# Seconds to wait for another process's migrations to finish.
+LOCK_TIMEOUT = 60.0
+
+
+def discover_migrations(migrations_path=DEFAULT_MIGRATIONS_PATH):
+    """Return ``[(version, path), ...]`` sorted by version."""
+    migrations = []
+    for name in os.listdir(migrations_path):
+        match = MIGRATION_FILE_RE.match(name)
+        if match:
+            migrations.append((int(match.group(1)), os.path.join(migrations_path, name)))
+    migrations.sort()
+    versions = [v for v, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {migrations_path}")
+    return migrations
+
+
+def split_statements(sql):
+    """Split a migration into single statements; semicolons inside a trigger body do not end one."""
+    statements = []
+    pending = ""
+    for piece in sql.split(";"):
+        pending += piece + ";"
+        if sqlite3.complete_statement(pending):
+            if pending.strip(" \t\r\n;"):
+                statements.append(pending)
+            pending = ""
+    return statements
+
+
+def current_version(conn):
+    """Return the schema version; call inside the migration transaction."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        " version INTEGER PRIMARY KEY,"
+        " applied TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    if row[0] is not None:
+        return row[0]
+
+    # Databases created from the old schema.sql predate schema_version;
+    # their tables match migration 1, so adopt them at that version.
+    tables = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'"
+        " AND name NOT LIKE 'sqlite_%' AND name != 'schema_version'"
+    ).fetchone()[0]
+    if tables:
+        conn.execute("INSERT INTO schema_version (version) VALUES (1)")
+        return 1
+    return 0
+
+
+def apply_migrations(db_path, migrations_path=DEFAULT_MIGRATIONS_PATH):
+    """Apply pending migrations to ``db_path``; return the versions applied."""
+    # Transactions are explicit: statements are run one by one, since
+    # executescript() would commit the lock away before the first of them.
+    conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = current_version(conn)
+            applied = []
+            for number, path in discover_migrations(migrations_path):
+                if number <= version:
+                    continue
+                with open(path, "r") as f:
+                    sql = f.read()
+                for statement in split_statements(sql):
+                    conn.execute(statement)
+                conn.execute("INSERT INTO schema_version (version) VALUES (?)", (number,))
+                applied.append(number)
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        return applied
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    db_arg = sys.argv[1] if len(sys.argv) > 1 else os.getenv("DB_PATH")
+    migrations_arg = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MIGRATIONS_PATH
+    if not db_arg:
+        sys.exit("usage: migrate.py DB_PATH [MIGRATIONS_DIR]")
+    done = apply_migrations(db_arg, migrations_arg)
+    print(f"Applied migrations: {done}" if done else "Database schema is up to date")
@@ -1,5 +1,4 @@
-DROP TABLE IF EXISTS posts;
-
+-- Baseline: the posts table as created by the original schema.sql.
 CREATE TABLE posts (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
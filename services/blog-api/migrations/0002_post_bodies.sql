@@ -0,0 +1,13 @@
+-- Post bodies live out of row so list queries only touch the narrow posts
+-- table. Bodies above a size threshold are zlib-compressed (compressed = 1);
+-- existing bodies are moved uncompressed and get compressed on their next write.
+CREATE TABLE post_bodies (
+    post_id INTEGER PRIMARY KEY REFERENCES posts (id) ON DELETE CASCADE,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    body BLOB NOT NULL
+);
+
+INSERT INTO post_bodies (post_id, compressed, body)
+SELECT id, 0, content FROM posts;
+
+ALTER TABLE posts DROP COLUMN content;
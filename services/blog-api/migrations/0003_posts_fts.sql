@@ -0,0 +1,8 @@
+-- Contentless full-text index over posts. Bodies are stored compressed, so
+-- the application keeps it in sync instead of triggers.
+CREATE VIRTUAL TABLE posts_fts USING fts5(title, content, content='');
+
+INSERT INTO posts_fts (rowid, title, content)
+SELECT posts.id, posts.title, post_bodies.body
+FROM posts JOIN post_bodies ON post_bodies.post_id = posts.id
+WHERE post_bodies.compressed = 0;
@@ -0,0 +1,3 @@
+-- Covers the /posts listing: keyset range scans on (created, id) read the
+-- title from the index without touching the table.
+CREATE INDEX idx_posts_created_id ON posts (created, id, title);
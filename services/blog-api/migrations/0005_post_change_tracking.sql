@@ -0,0 +1,25 @@
+-- Validators for conditional GETs: a per-post updated_at plus a table-level
+-- change counter, so ETag/Last-Modified never require reading post bodies.
+ALTER TABLE posts ADD COLUMN updated_at TIMESTAMP;
+
+UPDATE posts SET updated_at = created;
+
+CREATE TABLE change_counters (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO change_counters (name) VALUES ('posts');
+
+CREATE TRIGGER posts_changed_ai AFTER INSERT ON posts BEGIN
+    UPDATE change_counters SET version = version + 1, changed_at = CURRENT_TIMESTAMP WHERE name = 'posts';
+END;
+
+CREATE TRIGGER posts_changed_au AFTER UPDATE ON posts BEGIN
+    UPDATE change_counters SET version = version + 1, changed_at = CURRENT_TIMESTAMP WHERE name = 'posts';
+END;
+
+CREATE TRIGGER posts_changed_ad AFTER DELETE ON posts BEGIN
+    UPDATE change_counters SET version = version + 1, changed_at = CURRENT_TIMESTAMP WHERE name = 'posts';
+END;
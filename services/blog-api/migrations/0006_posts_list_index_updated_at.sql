@@ -0,0 +1,4 @@
+-- Listings now select updated_at (it versions each post's cached JSON), so
+-- widen the covering index to keep keyset scans off the table.
+DROP INDEX idx_posts_created_id;
+CREATE INDEX idx_posts_created_id ON posts (created, id, title, updated_at);
@@ -0,0 +1,85 @@
+"""Micro-benchmark: cost per post of serializing a /posts listing.
+
+Compares the old path (sqlite3.Row -> dict -> jsonify) with tuple rows into
+slotted Post objects, both cold (every fragment encoded) and warm (spliced
+from the fragment cache). Runs against a throwaway database:
+
+    python scripts/bench_serialization.py --posts 5000 --page 100 --repeat 200
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as blog_app  # noqa: E402
+from fragments import FragmentCache  # noqa: E402
+
+LIST_SQL = "SELECT id, title, created, updated_at FROM posts ORDER BY created DESC, id DESC LIMIT ?"
+
+
+def seed(db_path, count):
+    blog_app.migrate.apply_migrations(db_path)
+    conn = sqlite3.connect(db_path)
+    start = datetime(2024, 1, 1)
+    for i in range(count):
+        blog_app.insert_post(conn, f"Benchmark post {i}", "Body " * 20, created=start + timedelta(seconds=i))
+    conn.commit()
+    conn.close()
+
+
+def row_dicts(conn, page):
+    return blog_app.jsonify([dict(row) for row in conn.execute(LIST_SQL, (page,)).fetchall()]).get_data()
+
+
+def fragments_cold(conn, page):
+    return FragmentCache(page).encode_list(blog_app.select_posts(conn, LIST_SQL, (page,)))
+
+
+def fragments_warm(conn, page, cache):
+    return cache.encode_list(blog_app.select_posts(conn, LIST_SQL, (page,)))
+
+
+def per_post_us(fn, repeat, page):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / (repeat * page) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        seed(db_path, args.posts)
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        cache = FragmentCache(args.page)
+        fragments_warm(conn, args.page, cache)
+
+        with blog_app.app.app_context():
+            results = [
+                ("row -> dict -> jsonify", per_post_us(lambda: row_dicts(conn, args.page), args.repeat, args.page)),
+                ("tuple -> Post, cold", per_post_us(lambda: fragments_cold(conn, args.page), args.repeat, args.page)),
+                ("tuple -> Post, cached", per_post_us(
+                    lambda: fragments_warm(conn, args.page, cache), args.repeat, args.page)),
+            ]
+        conn.close()
+
+    baseline = results[0][1]
+    print(f"{args.page} posts per page, {args.repeat} pages")
+    for name, us in results:
+        print(f"  {name:<24} {us:7.2f} us/post  ({baseline / us:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -43,6 +43,7 @@ def test_delete_post(client):
     res = client.delete("/posts/1")
     assert res.status_code == 200
     assert "deleted" in res.get_json()["message"].lower()
+    assert res.get_json()["id"] == 1
 
     res2 = client.get("/posts/1")
     assert res2.status_code == 404
@@ -53,3 +54,477 @@ def test_validation(client):
     assert res.status_code == 400
     res = client.put("/posts/1", json={"title": "ok", "content": ""})
     assert res.status_code == 400
+
+
+def test_search_posts(client):
+    client.post("/posts", json={"title": "Gardening notes", "content": "Tomatoes and basil"})
+    client.post("/posts", json={"title": "Cooking", "content": "Basil pesto with gardening herbs"})
+
+    res = client.get("/posts?q=gardening")
+    assert res.status_code == 200
+    titles = [p["title"] for p in res.get_json()]
+    # title matches outrank body matches
+    assert titles == ["Gardening notes", "Cooking"]
+
+    res = client.get("/posts?q=gardening&limit=1&page=2")
+    assert [p["title"] for p in res.get_json()] == ["Cooking"]
+
+    client.put("/posts/1", json={"title": "First Post", "content": "now about gardening"})
+    client.delete("/posts/1")
+    assert len(client.get("/posts?q=gardening").get_json()) == 2
+    assert client.get('/posts?q="unbalanced').status_code == 200
+    # NUL would end FTS5's string literal mid-query
+    assert client.get("/posts?q=%00").get_json() == []
+    assert [p["title"] for p in client.get("/posts?q=garden%00ing").get_json()] == ["Gardening notes", "Cooking"]
+
+
+def test_search_is_never_streamed(client):
+    plain = client.get("/posts?q=first")
+    asked = client.get("/posts?q=first", headers={"Accept": "application/x-ndjson"})
+    assert asked.mimetype == "application/json"
+    assert asked.get_json() == plain.get_json()
+    # same representation, same validator: a 304 always stands for JSON
+    assert asked.headers["ETag"] == plain.headers["ETag"]
+    res = client.get("/posts?q=first&stream=1")
+    assert res.mimetype == "application/json"
+    assert [p["title"] for p in res.get_json()] == ["First Post"]
+    assert "content" not in res.get_json()[0]
+
+
+def test_long_bodies_stored_compressed_and_listed_without_content(client):
+    import sqlite3
+
+    body = "A fairly long post body that repeats itself." * 100
+    created = client.post("/posts", json={"title": "Long", "content": body}).get_json()
+    assert created["content"] == body
+    assert client.get(f"/posts/{created['id']}").get_json()["content"] == body
+    assert all("content" not in p for p in client.get("/posts").get_json())
+
+    db_path = client.application.config["DATABASE_PATH"]
+    row = sqlite3.connect(db_path).execute(
+        "SELECT compressed, length(body) FROM post_bodies WHERE post_id = ?", (created["id"],)
+    ).fetchone()
+    assert row[0] == 1
+    assert row[1] < len(body)
+
+
+def test_list_posts_cursor_pagination(client):
+    for i in range(3):
+        client.post("/posts", json={"title": f"Paged {i}", "content": "Body"})
+
+    seen = []
+    url = "/posts?limit=2"
+    while url:
+        res = client.get(url)
+        assert res.status_code == 200
+        page = res.get_json()
+        assert len(page) <= 2
+        seen.extend(p["title"] for p in page)
+        cursor = res.headers.get("X-Next-Cursor")
+        url = f"/posts?limit=2&cursor={cursor}" if cursor else None
+
+    assert seen == ["Paged 2", "Paged 1", "Paged 0", "Second Post", "First Post"]
+    assert client.get("/posts?cursor=garbage").status_code == 400
+
+
+def test_migrations_upgrade_legacy_database(tmp_path):
+    import sqlite3
+
+    import migrate
+
+    # a database created by the pre-migrations schema.sql
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "CREATE TABLE posts (id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,"
+        " title TEXT NOT NULL, content TEXT NOT NULL)"
+    )
+    conn.execute("INSERT INTO posts (title, content) VALUES ('Old', 'Legacy body')")
+    conn.commit()
+    conn.close()
+
+    applied = migrate.apply_migrations(db_path)
+    assert applied[0] == 2
+    assert migrate.apply_migrations(db_path) == []
+
+    conn = sqlite3.connect(db_path)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(posts)")]
+    assert "content" not in columns
+    assert conn.execute("SELECT body FROM post_bodies WHERE post_id = 1").fetchone()[0] == "Legacy body"
+    assert conn.execute("SELECT rowid FROM posts_fts WHERE posts_fts MATCH 'legacy'").fetchall() == [(1,)]
+
+
+def test_concurrent_migrations_apply_once(tmp_path):
+    import threading
+
+    import migrate
+
+    db_path = str(tmp_path / "fresh.db")
+    versions = [number for number, _ in migrate.discover_migrations()]
+    barrier = threading.Barrier(4)
+    results, errors = [], []
+
+    def start_process():
+        barrier.wait()
+        try:
+            results.append(migrate.apply_migrations(db_path))
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=start_process) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert sorted(results) == [[], [], [], versions]
+
+
+def test_failed_migration_rolls_back(tmp_path):
+    import sqlite3
+
+    import pytest
+
+    import migrate
+
+    migrations = tmp_path / "migrations"
+    migrations.mkdir()
+    (migrations / "0001_tags.sql").write_text("CREATE TABLE tags (name TEXT);\nINSERT INTO tags VALUES ('a;b');\n")
+    (migrations / "0002_broken.sql").write_text("CREATE TABLE nope (;\n")
+    db_path = str(tmp_path / "fresh.db")
+    with pytest.raises(sqlite3.OperationalError):
+        migrate.apply_migrations(db_path, str(migrations))
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'tags'").fetchall() == []
+
+    (migrations / "0002_broken.sql").unlink()
+    assert migrate.apply_migrations(db_path, str(migrations)) == [1]
+    assert conn.execute("SELECT name FROM tags").fetchall() == [("a;b",)]
+    conn.close()
+
+
+def test_batch_create_update_delete(client):
+    res = client.post(
+        "/posts:batch",
+        json=[{"title": "B1", "content": "one"}, {"title": "", "content": "x"}, {"title": "B2", "content": "two"}],
+    )
+    assert res.status_code == 207
+    body = res.get_json()
+    assert [r["status"] for r in body["results"]] == [201, 400, 201]
+    assert body["succeeded"] == 2
+    ids = [r["post"]["id"] for r in body["results"] if r["status"] == 201]
+    assert client.get(f"/posts/{ids[1]}").get_json()["content"] == "two"
+
+    ndjson = "\n".join(
+        [
+            f'{{"id": {ids[0]}, "title": "B1 edited", "content": "uno"}}',
+            '{"id": 999, "title": "Missing", "content": "x"}',
+            "not json",
+        ]
+    )
+    res = client.put("/posts:batch", data=ndjson, content_type="application/x-ndjson")
+    assert [r["status"] for r in res.get_json()["results"]] == [200, 404, 400]
+    assert client.get(f"/posts/{ids[0]}").get_json()["title"] == "B1 edited"
+    assert [p["id"] for p in client.get("/posts?q=uno").get_json()] == [ids[0]]
+
+    res = client.delete("/posts:batch", json=ids + [{"id": ids[0]}])
+    assert res.status_code == 207
+    assert [r["status"] for r in res.get_json()["results"]] == [200, 200, 404]
+    assert client.get(f"/posts/{ids[0]}").status_code == 404
+    assert client.get("/posts?q=uno").get_json() == []
+
+
+def test_batch_rejects_bad_bodies(client):
+    assert client.post("/posts:batch", json={"title": "x"}).status_code == 400
+    client.application.config["MAX_BATCH_SIZE"] = 1
+    assert client.post("/posts:batch", json=[{}, {}]).status_code == 413
+
+
+def test_list_posts_ndjson_stream(client):
+    import json
+
+    client.application.config["STREAM_CHUNK_SIZE"] = 1
+    client.post("/posts", json={"title": "Third Post", "content": "Third content"})
+
+    res = client.get("/posts", headers={"Accept": "application/x-ndjson"})
+    assert res.status_code == 200
+    assert res.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in res.data.decode().splitlines()]
+    assert [r["title"] for r in rows] == ["Third Post", "Second Post", "First Post"]
+    assert rows[0]["content"] == "Third content"
+
+    res = client.get("/posts?stream=1&limit=2")
+    assert len(res.data.decode().splitlines()) == 2
+    # plain JSON remains the default
+    assert isinstance(client.get("/posts").get_json(), list)
+
+
+def test_conditional_get_post(client):
+    import sqlite3
+
+    db = sqlite3.connect(client.application.config["DATABASE_PATH"])
+    db.execute("UPDATE posts SET updated_at = '2024-01-01 00:00:00.250000' WHERE id = 1")
+    db.commit()
+    res = client.get("/posts/1")
+    etag = res.headers["ETag"]
+    last_modified = res.headers["Last-Modified"]
+
+    res = client.get("/posts/1", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.data == b""
+    res = client.get("/posts/1", headers={"If-Modified-Since": last_modified})
+    assert res.status_code == 304
+
+    client.put("/posts/1", json={"title": "Changed", "content": "Changed body"})
+    res = client.get("/posts/1", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+    # changed within the current second: a second-resolution date cannot
+    # validate it, so only the ETag is sent
+    assert "Last-Modified" not in res.headers
+    assert client.get("/posts/1", headers={"If-Modified-Since": last_modified}).status_code == 200
+
+
+def test_conditional_get_listing(client):
+    etag = client.get("/posts?limit=1").headers["ETag"]
+    assert client.get("/posts?limit=1", headers={"If-None-Match": etag}).status_code == 304
+    # a different page or representation is a different entity
+    assert client.get("/posts?limit=2", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/posts?limit=1&stream=1", headers={"If-None-Match": etag}).status_code == 200
+
+    client.delete("/posts/2")
+    assert client.get("/posts?limit=1", headers={"If-None-Match": etag}).status_code == 200
+    assert "Last-Modified" not in client.get("/posts?limit=1").headers
+
+
+def test_concurrent_writes_are_group_committed(client):
+    from concurrent.futures import ThreadPoolExecutor
+
+    app = client.application
+    # a wider window than production so even a slow machine overlaps writes
+    app.config["WRITE_BATCH_WINDOW_MS"] = 20
+    app.extensions.pop("db_writer", None)
+
+    def create(i):
+        with app.test_client() as c:
+            return c.post("/posts", json={"title": f"Concurrent {i}", "content": "Body"}).status_code
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(create, range(64)))
+    assert statuses == [201] * 64
+
+    stats = client.get("/metrics/db").get_json()
+    assert stats["writer"]["writes"] == 64
+    assert stats["writer"]["groups"] < 64
+    assert len(client.get("/posts?limit=100").get_json()) == 66
+
+
+def test_writer_isolates_failed_mutations(tmp_path):
+    import sqlite3
+
+    import pytest
+
+    from db import GroupCommitWriter
+
+    writer = GroupCommitWriter(str(tmp_path / "w.db"), max_delay=0.05)
+    writer.run(lambda conn: conn.execute("CREATE TABLE t (v INTEGER UNIQUE)"))
+
+    ok = writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (1)").lastrowid)
+    bad = writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (1)"))
+    also_ok = writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (2)").lastrowid)
+    assert ok.result() == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        bad.result()
+    assert also_ok.result() == 2
+    writer.close()
+
+    rows = sqlite3.connect(tmp_path / "w.db").execute("SELECT v FROM t ORDER BY v").fetchall()
+    assert rows == [(1,), (2,)]
+
+
+def test_post_json_fragments_are_cached_and_invalidated(client):
+    first = client.get("/posts").get_json()
+    stats = client.get("/metrics/fragment-cache").get_json()
+    assert stats["misses"] == 2 and stats["hits"] == 0
+
+    # an unchanged listing is spliced entirely from cached fragments
+    assert client.get("/posts").get_json() == first
+    stats = client.get("/metrics/fragment-cache").get_json()
+    assert stats["hits"] == 2
+
+    client.get("/posts/1")
+    assert client.get("/posts/1").get_json()["content"] == "First content"
+    client.put("/posts/1", json={"title": "Edited", "content": "Edited body"})
+    assert client.get("/posts/1").get_json()["content"] == "Edited body"
+    assert [p["title"] for p in client.get("/posts").get_json()] == ["Second Post", "Edited"]
+
+    client.delete("/posts:batch", json=[2])
+    assert client.get("/metrics/fragment-cache").get_json()["entries"] == 2
+
+
+def test_fragment_cache_misses_on_stale_version():
+    from fragments import SUMMARY, FragmentCache, Post
+
+    cache = FragmentCache(max_entries=2)
+    cache.encode(Post(1, "A", "2024-01-01", "v1"))
+    assert cache.get(1, SUMMARY, "v1") == b'{"id":1,"title":"A","created":"2024-01-01","updated_at":"v1"}'
+    assert cache.get(1, SUMMARY, "v2") is None
+    cache.encode(Post(2, "B", "2024-01-01", "v1"))
+    cache.encode(Post(3, "C", "2024-01-01", "v1"))
+    assert cache.stats()["entries"] == 2
+    assert cache.get(1, SUMMARY, "v1") is None
+
+
+def test_sparse_fieldsets(client):
+    res = client.get("/posts?fields=id,title")
+    assert res.get_json() == [{"id": 2, "title": "Second Post"}, {"id": 1, "title": "First Post"}]
+
+    listed = client.get("/posts?fields=content,id&limit=1").get_json()
+    assert listed == [{"id": 2, "content": "Second content"}]
+    assert client.get("/posts?q=first&fields=title").get_json() == [{"title": "First Post"}]
+
+    single = client.get("/posts/1?fields=title,created")
+    assert set(single.get_json()) == {"title", "created"}
+    assert single.headers["ETag"] != client.get("/posts/1").headers["ETag"]
+
+    lines = client.get("/posts?stream=1&fields=id").data.decode().splitlines()
+    assert lines == ['{"id":2}', '{"id":1}']
+    assert client.get("/posts?fields=id,password").status_code == 400
+
+
+def test_responses_are_gzipped_when_accepted(client):
+    import gzip
+
+    body = "Compressible body text. " * 100
+    client.post("/posts", json={"title": "Big", "content": body})
+
+    plain = client.get("/posts/3")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    res = client.get("/posts/3", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert len(res.data) < len(plain.data)
+    assert gzip.decompress(res.data) == plain.data
+    # the weakened ETag still validates
+    etag = res.headers["ETag"]
+    assert etag.startswith("W/")
+    assert client.get("/posts/3", headers={"If-None-Match": etag}).status_code == 304
+
+    # small bodies are not worth compressing
+    assert "Content-Encoding" not in client.get("/health", headers={"Accept-Encoding": "gzip"}).headers
+
+    streamed = client.get("/posts?stream=1", headers={"Accept-Encoding": "gzip"})
+    assert streamed.headers["Content-Encoding"] == "gzip"
+    assert len(gzip.decompress(streamed.data).splitlines()) == 3
+
+
+def test_writes_require_verified_token_when_jwks_configured(client):
+    import json
+    from datetime import datetime, timedelta, timezone
+
+    import jwt
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    from jwt_verifier import TokenVerifier
+
+    key = ed25519.Ed25519PrivateKey.generate()
+    jwk = dict(json.loads(jwt.algorithms.OKPAlgorithm.to_jwk(key.public_key())), kid="k1", alg="EdDSA", use="sig")
+    fetches = []
+
+    def fetch(url, timeout):
+        fetches.append(url)
+        return {"keys": [jwk]}
+
+    app = client.application
+    app.config["AUTH_JWKS_URL"] = "http://auth/.well-known/jwks.json"
+    app.extensions["jwt_verifier"] = TokenVerifier(app.config["AUTH_JWKS_URL"], fetch=fetch)
+
+    def token(kid="k1", signer=key, **claims):
+        claims.setdefault("exp", datetime.now(timezone.utc) + timedelta(minutes=5))
+        return jwt.encode(dict(sub="1", **claims), signer, algorithm="EdDSA", headers={"kid": kid})
+
+    payload = {"title": "Authed", "content": "Body"}
+    assert client.post("/posts", json=payload).status_code == 401
+    res = client.post("/posts", json=payload, headers={"Authorization": f"Bearer {token()}"})
+    assert res.status_code == 201
+    assert client.get("/posts/1").status_code == 200  # reads stay open
+
+    forged = token(signer=ed25519.Ed25519PrivateKey.generate())
+    assert client.delete("/posts/1", headers={"Authorization": f"Bearer {forged}"}).status_code == 401
+    expired = token(exp=datetime.now(timezone.utc) - timedelta(minutes=1))
+    assert client.delete("/posts/1", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+    # an unknown kid may trigger one early refetch, not one per request
+    for _ in range(3):
+        assert client.delete("/posts/1", headers={"Authorization": f"Bearer {token(kid='nope')}"}).status_code == 401
+    assert len(fetches) == 1
+
+
+def test_request_deadline_budget(client):
+    assert client.get("/posts", headers={"X-Request-Deadline-Ms": "2000"}).status_code == 200
+    assert client.get("/posts", headers={"X-Request-Deadline-Ms": "0"}).status_code == 504
+    res = client.post("/posts", json={"title": "Late", "content": "Body"}, headers={"X-Request-Deadline-Ms": "-5"})
+    assert res.status_code == 504
+    assert res.get_json() == {"error": "Deadline exceeded"}
+    assert len(client.get("/posts").get_json()) == 2
+
+
+def test_writer_drops_writes_queued_past_their_deadline(tmp_path):
+    import sqlite3
+    import threading
+    import time
+
+    import pytest
+
+    from db import DeadlineExceeded, GroupCommitWriter
+
+    writer = GroupCommitWriter(str(tmp_path / "w.db"))
+    writer.run(lambda conn: conn.execute("CREATE TABLE t (v INTEGER)"))
+
+    release = threading.Event()
+    blocker = writer.submit(lambda conn: release.wait(5))
+    late = writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (1)"), deadline=time.monotonic() + 0.01)
+    on_time = writer.submit(lambda conn: conn.execute("INSERT INTO t VALUES (2)"), deadline=time.monotonic() + 60)
+    time.sleep(0.05)
+    release.set()
+    blocker.result()
+    with pytest.raises(DeadlineExceeded):
+        late.result()
+    on_time.result()
+    assert writer.stats()["expired"] == 1
+    writer.close()
+
+    rows = sqlite3.connect(tmp_path / "w.db").execute("SELECT v FROM t").fetchall()
+    assert rows == [(2,)]
+
+
+def test_read_connections_return_to_the_pool(client):
+    import pytest
+
+    import app as blog_app
+
+    app = client.application
+    app.config["READ_POOL_SIZE"] = 2
+    app.extensions.pop("db_read_pool", None)
+    blog_app.get_read_pool().timeout = 0.5
+
+    # HEAD never iterates the export, and a client may drop before the first chunk
+    for _ in range(3):
+        assert client.head("/posts?stream=1").status_code == 200
+    client.get("/posts?stream=1", buffered=False).close()
+    assert client.get("/posts").status_code == 200
+
+    def broken(*args):
+        raise RuntimeError("query failed")
+
+    saved = blog_app.select_posts
+    blog_app.select_posts = broken
+    try:
+        for path in ("/posts?q=first", "/posts/1"):
+            with pytest.raises(RuntimeError, match="query failed"):
+                client.get(path)
+    finally:
+        blog_app.select_posts = saved
+    stats = client.get("/metrics/db").get_json()["read_pool"]
+    assert stats["idle"] == stats["open"]
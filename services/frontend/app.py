@@ -1,41 +1,267 @@
+import json
+import math
 import os
-from urllib.parse import urljoin
+import time
 
+import jwt
 import requests
-from flask import Flask, flash, redirect, render_template, request, url_for
-from werkzeug.exceptions import abort
+from flask import Flask, Response, flash, g, jsonify, redirect, render_template, request, stream_template, url_for
+from werkzeug.exceptions import GatewayTimeout, abort
+
+import compose
+import template_cache
+import upstream
+from breaker import CircuitOpen
+from compression import Compress
+from jwt_verifier import KeySetUnavailable, TokenVerifier, bearer_token
+from static_assets import StaticAssets
+from swr_cache import SWRCache
+from upstream import Upstream
 
 BLOG_API_BASE = os.getenv("BLOG_API_BASE", "http://localhost:5001/")
-AUTH_API_BASE = os.getenv("AUTH_API_BASE", "http://localhost:5002/")  # reserved for future use
+AUTH_API_BASE = os.getenv("AUTH_API_BASE", "http://localhost:5002/")
 
 app = Flask(__name__, template_folder="templates", static_folder="static")
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret")
+app.config["POSTS_PER_PAGE"] = int(os.getenv("POSTS_PER_PAGE", "20"))
+# Seconds a request may spend waiting on upstreams; calls made for a page run
+# concurrently, and blog-api is told how much of the budget is left.
+app.config["PAGE_DEADLINE"] = float(os.getenv("PAGE_DEADLINE", "3"))
+# Render the index while blog-api's NDJSON export is still arriving: every
+# post after the cursor, in constant memory, flushed in chunks of at least
+# INDEX_STREAM_BUFFER bytes.
+app.config["INDEX_STREAM"] = os.getenv("INDEX_STREAM", "0") == "1"
+app.config["INDEX_STREAM_BUFFER"] = int(os.getenv("INDEX_STREAM_BUFFER", "4096"))
 
+Compress(app)
+# Templates come from the image's precompiled build when it is current.
+template_cache.init_app(app)
+# Static files are served fingerprinted and immutable from the image's build.
+StaticAssets(app)
 
-def api_url(base, path):
-    return urljoin(base, path.lstrip("/"))
+# index.html only shows these; blog-api skips reading the rest.
+INDEX_FIELDS = "id,title,created"
 
+# One pooled keep-alive client per upstream, shared by all request threads.
+blog_api = Upstream.from_env("blog-api", "BLOG_API", BLOG_API_BASE)
+auth_api = Upstream.from_env("auth", "AUTH_API", AUTH_API_BASE)
 
-def get_post(post_id):
-    resp = requests.get(api_url(BLOG_API_BASE, f"/posts/{post_id}"), timeout=5)
+# blog-api reads, keyed ("posts", limit, cursor) and ("post", id), cached
+# with their ETags so that refreshes can be conditional.
+api_cache = SWRCache(
+    ttl=float(os.getenv("FRONTEND_CACHE_TTL", "2")),
+    stale_ttl=float(os.getenv("FRONTEND_CACHE_STALE_TTL", "30")),
+    max_entries=int(os.getenv("FRONTEND_CACHE_SIZE", "1024")),
+)
+
+
+def fetch_jwks(url, timeout):
+    resp = auth_api.session.get(url, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+
+# Tokens from the auth service are verified locally against its published
+# keys; a page render never calls /me.
+verifier = TokenVerifier(
+    os.getenv("AUTH_JWKS_URL") or auth_api.url("/.well-known/jwks.json"),
+    ttl=float(os.getenv("JWKS_CACHE_TTL", "300")),
+    fetch=fetch_jwks,
+)
+
+
+@app.before_request
+def start_deadline():
+    upstream.DEADLINE.set(time.monotonic() + app.config["PAGE_DEADLINE"])
+
+
+@app.errorhandler(requests.RequestException)
+def upstream_unavailable(exc):
+    """Render a degraded page quickly instead of a 500 when an upstream fails or is cut off."""
+    retry_after = exc.retry_after if isinstance(exc, CircuitOpen) else 1
+    status = 504 if isinstance(exc, upstream.DeadlineExceeded) else 503
+    resp = app.make_response((render_template("unavailable.html"), status))
+    resp.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return resp
+
+
+@app.errorhandler(GatewayTimeout)
+def page_deadline_exceeded(exc):
+    return render_template("unavailable.html"), 504
+
+
+def request_token():
+    """The caller's access token: an Authorization header or the access_token cookie."""
+    return bearer_token(request.headers.get("Authorization")) or request.cookies.get("access_token")
+
+
+def current_user():
+    """Return the verified token claims for this request, or None."""
+    if "user_claims" not in g:
+        token = request_token()
+        g.user_claims = None
+        if token:
+            try:
+                g.user_claims = verifier.verify(token)
+            except (jwt.InvalidTokenError, KeySetUnavailable):
+                pass
+    return g.user_claims
+
+
+@app.context_processor
+def inject_current_user():
+    return {"current_user": current_user}
+
+
+def auth_headers():
+    """Forward the caller's token to blog-api, which may require it for writes."""
+    token = request_token()
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
+
+def if_none_match(cached):
+    """Headers that revalidate a cached ``(etag, ...)`` value instead of downloading it again."""
+    return {"If-None-Match": cached[0]} if cached and cached[0] else {}
+
+
+def load_post(post_id):
+    """Return ``(etag, post)``, or None if there is no such post."""
+    cached = api_cache.peek(("post", post_id))
+    resp = blog_api.get(f"/posts/{post_id}", headers=if_none_match(cached))
+    if resp.status_code == 304:
+        return cached
     if resp.status_code == 404:
+        return None
+    resp.raise_for_status()
+    return resp.headers.get("ETag"), resp.json()
+
+
+def get_post(post_id):
+    cached = api_cache.get(("post", post_id), lambda: load_post(post_id))
+    if cached is None:
         abort(404)
+    return cached[1]
+
+
+def load_posts(limit, cursor):
+    """Return ``(etag, status, posts, next_cursor)`` for one index page."""
+    cached = api_cache.peek(("posts", limit, cursor))
+    params = {"limit": limit, "fields": INDEX_FIELDS}
+    if cursor:
+        params["cursor"] = cursor
+    resp = blog_api.get("/posts", params=params, headers=if_none_match(cached))
+    if resp.status_code == 304:
+        return cached
+    if resp.status_code == 400:
+        return None, 400, [], None
     resp.raise_for_status()
-    return resp.json()
+    return resp.headers.get("ETag"), 200, resp.json(), resp.headers.get("X-Next-Cursor")
+
+
+def page():
+    """Start composing this request's page against PAGE_DEADLINE.
+
+    The current user is looked up alongside whatever the view adds; it is
+    optional, so a slow or failing lookup renders the page signed out.
+    """
+    return compose.Page(app.config["PAGE_DEADLINE"]).add("user", current_user, required=False)
+
+
+def error_message(resp):
+    return resp.json().get("error") if resp.headers.get("content-type", "").startswith("application/json") else resp.text
+
+
+def open_post_stream(cursor):
+    """Start blog-api's NDJSON export of the index fields; only the headers have been read."""
+    params = {"stream": 1, "fields": INDEX_FIELDS}
+    if cursor:
+        params["cursor"] = cursor
+    resp = blog_api.get("/posts", params=params, stream=True)
+    if resp.status_code != 200:
+        resp.close()
+        if resp.status_code == 400:
+            abort(400)
+        resp.raise_for_status()
+    return resp
+
+
+def iter_posts(resp):
+    """Yield posts one NDJSON line at a time; at most one network chunk is held."""
+    for line in resp.iter_lines(chunk_size=16384):
+        if line:
+            yield json.loads(line)
+
+
+def buffered(chunks, size):
+    """Join template output into UTF-8 pieces of at least ``size`` characters.
+
+    Jinja yields a few bytes per expression; writing (and gzip-flushing)
+    each one separately would cost more than rendering it.
+    """
+    pending = []
+    length = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(pending).encode("utf-8")
+            pending.clear()
+            length = 0
+    if pending:
+        yield "".join(pending).encode("utf-8")
+
+
+def posts_changed(post_id=None):
+    """Drop cached listings (and ``post_id``) after this frontend wrote to blog-api."""
+    api_cache.invalidate(lambda key: key[0] == "posts" or key == ("post", post_id))
+
+
+@app.route("/metrics/upstreams")
+def upstream_stats():
+    return jsonify({u.name: u.stats() for u in (blog_api, auth_api)})
+
+
+@app.route("/metrics/cache")
+def cache_stats():
+    return jsonify(api_cache.stats())
+
+
+@app.route("/metrics/pages")
+def page_stats():
+    return jsonify(compose.stats())
 
 
 @app.route("/")
 def index():
-    resp = requests.get(api_url(BLOG_API_BASE, "/posts"), timeout=5)
-    resp.raise_for_status()
-    posts = resp.json()
-    return render_template("index.html", posts=posts)
+    limit = app.config["POSTS_PER_PAGE"]
+    cursor = request.args.get("cursor")
+    if app.config["INDEX_STREAM"]:
+        return stream_index(cursor)
+    parts = page().add("posts", api_cache.get, ("posts", limit, cursor), lambda: load_posts(limit, cursor)).results()
+    _, status, posts, next_cursor = parts["posts"]
+    if status == 400:
+        abort(400)
+    return render_template(
+        "index.html",
+        posts=posts,
+        cursor=cursor,
+        next_cursor=next_cursor,
+    )
+
+
+def stream_index(cursor):
+    upstream_resp = open_post_stream(cursor)
+    current_user()  # resolve before the body starts, while errors can still become a page
+    body = stream_template("index.html", posts=iter_posts(upstream_resp), cursor=cursor, next_cursor=None)
+    resp = Response(buffered(body, app.config["INDEX_STREAM_BUFFER"]), mimetype="text/html")
+    resp.call_on_close(upstream_resp.close)
+    return resp
 
 
 @app.route("/<int:post_id>")
 def post(post_id):
-    post = get_post(post_id)
-    return render_template("post.html", post=post)
+    parts = page().add("post", get_post, post_id).results()
+    return render_template("post.html", post=parts["post"])
 
 
 @app.route("/create", methods=("GET", "POST"))
@@ -46,48 +272,42 @@ def create():
         if not title:
             flash("Title is required!")
         else:
-            resp = requests.post(
-                api_url(BLOG_API_BASE, "/posts"),
-                json={"title": title, "content": content},
-                timeout=5,
-            )
+            resp = blog_api.post("/posts", json={"title": title, "content": content}, headers=auth_headers())
             if resp.status_code == 201:
+                posts_changed()
                 return redirect(url_for("index"))
-            msg = resp.json().get("error") if resp.headers.get("content-type", "").startswith("application/json") else resp.text
-            flash(f"Error creating post: {msg}")
+            flash(f"Error creating post: {error_message(resp)}")
     return render_template("create.html")
 
 
 @app.route("/<int:id>/edit", methods=("GET", "POST"))
 def edit(id):
-    post = get_post(id)
     if request.method == "POST":
         title = request.form.get("title", "").strip()
         content = request.form.get("content", "").strip()
         if not title:
             flash("Title is required!")
         else:
-            resp = requests.put(
-                api_url(BLOG_API_BASE, f"/posts/{id}"),
-                json={"title": title, "content": content},
-                timeout=5,
-            )
+            resp = blog_api.put(f"/posts/{id}", json={"title": title, "content": content}, headers=auth_headers())
             if resp.status_code == 200:
+                posts_changed(id)
                 return redirect(url_for("index"))
-            msg = resp.json().get("error") if resp.headers.get("content-type", "").startswith("application/json") else resp.text
-            flash(f"Error updating post: {msg}")
-    return render_template("edit.html", post=post)
+            flash(f"Error updating post: {error_message(resp)}")
+    # The current post is only needed to (re-)render the form.
+    return render_template("edit.html", post=page().add("post", get_post, id).results()["post"])
 
 
 @app.route("/<int:id>/delete", methods=("POST",))
 def delete(id):
-    post = get_post(id)
-    resp = requests.delete(api_url(BLOG_API_BASE, f"/posts/{id}"), timeout=5)
-    if resp.status_code not in (200, 204):
-        msg = resp.json().get("error") if resp.headers.get("content-type", "").startswith("application/json") else resp.text
-        flash(f"Error deleting post: {msg}")
+    # blog-api reports the deleted post's title, so no lookup precedes this.
+    resp = blog_api.delete(f"/posts/{id}", headers=auth_headers())
+    posts_changed(id)
+    if resp.status_code == 404:
+        abort(404)
+    if resp.status_code != 200:
+        flash(f"Error deleting post: {error_message(resp)}")
         return redirect(url_for("index"))
-    flash(f'"{post["title"]}" was successfully deleted!')
+    flash(f'"{resp.json()["title"]}" was successfully deleted!')
     return redirect(url_for("index"))
 
 
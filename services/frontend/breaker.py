@@ -0,0 +1,116 @@
+"""A circuit breaker for one upstream.
+
+While an upstream is down or drowning, every call to it used to sit out its
+full timeout, so a partial outage exhausted the frontend's workers as well.
+The breaker watches the outcomes over the last ``window`` seconds. Once at
+least ``min_requests`` calls have been made and the share of failures
+(exceptions and 5xx responses) reaches ``threshold``, it opens. Calls then
+fail at once with ``CircuitOpen`` for ``cooldown`` seconds. After that a
+single probe call is let through: success closes the breaker, failure opens
+it for another cooldown.
+"""
+import threading
+import time
+from collections import deque
+
+import requests
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(requests.ConnectionError):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"{name} circuit open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name, threshold=0.5, min_requests=20, window=10.0, cooldown=5.0, clock=time.monotonic):
+        self.name = name
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self._outcomes = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    def _prune(self, now):
+        while self._outcomes and self._outcomes[0][0] <= now - self.window:
+            _, ok = self._outcomes.popleft()
+            if not ok:
+                self._failures -= 1
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go out now.
+
+        Returns True if the call is the half-open probe; pass that on to
+        ``record()``.
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return False
+            retry_after = self._opened_at + self.cooldown - self.clock()
+            if self.state == OPEN and retry_after <= 0:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            raise CircuitOpen(self.name, max(retry_after, 0.0))
+
+    def record(self, ok, probe=False):
+        now = self.clock()
+        with self._lock:
+            if probe:
+                self._probing = False
+                if ok:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                    self._failures = 0
+                else:
+                    self._open(now)
+                return
+            if self.state != CLOSED:
+                # Calls that went out before the breaker opened say nothing
+                # about whether the upstream has recovered.
+                return
+            self._outcomes.append((now, ok))
+            if not ok:
+                self._failures += 1
+            self._prune(now)
+            total = len(self._outcomes)
+            if total >= self.min_requests and self._failures >= self.threshold * total:
+                self._open(now)
+
+    def cancel(self, probe):
+        """Forget a call that was abandoned before its outcome said anything about the upstream."""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def _open(self, now):
+        self.state = OPEN
+        self._opened_at = now
+        self.opened += 1
+
+    def stats(self):
+        with self._lock:
+            self._prune(self.clock())
+            return {
+                "state": self.state,
+                "window_requests": len(self._outcomes),
+                "window_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,90 @@
+"""Concurrent upstream fan-out for page composition.
+
+A page that needs a post, the current user and so on used to fetch them one
+after another, so its latency was the sum of its dependencies. A ``Page``
+starts each independent fetch on a shared thread pool at once and waits
+for all of them against a single per-page deadline, so the page now takes as
+long as its slowest dependency.
+
+Fetches run in a copy of the caller's context, so ``request``, ``g`` and
+the app config work inside them as usual, and their upstream calls are
+bounded by the page deadline (or the request's, if that is sooner). A required fetch that fails
+re-raises in the view (an ``abort(404)`` stays a 404). If one is still
+running at the deadline the page fails with 504. An optional fetch that
+fails or runs late yields its default, so the page renders without it.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from werkzeug.exceptions import GatewayTimeout
+
+import upstream
+
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", "32"))
+
+# Shared by every request thread; a page's calls never wait on one another.
+_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="page-fanout")
+
+_lock = threading.Lock()
+_counters = {"pages": 0, "calls": 0, "deadline_exceeded": 0, "degraded": 0, "failed": 0}
+
+
+def _count(key, n=1):
+    with _lock:
+        _counters[key] += n
+
+
+def stats():
+    with _lock:
+        return dict(_counters, workers=FANOUT_WORKERS)
+
+
+class Page:
+    """The upstream calls behind one page, all sharing one deadline."""
+
+    def __init__(self, deadline):
+        self.deadline_at = time.monotonic() + deadline
+        request_deadline = upstream.DEADLINE.get()
+        if request_deadline is not None:
+            self.deadline_at = min(self.deadline_at, request_deadline)
+        self._parts = {}
+        _count("pages")
+
+    def remaining(self):
+        return max(0.0, self.deadline_at - time.monotonic())
+
+    def add(self, name, fn, *args, required=True, default=None, **kwargs):
+        """Start ``fn(*args, **kwargs)`` now; its result will be ``results()[name]``."""
+        ctx = contextvars.copy_context()
+        future = _executor.submit(ctx.run, self._call, fn, args, kwargs)
+        self._parts[name] = (future, required, default)
+        _count("calls")
+        return self
+
+    def _call(self, fn, args, kwargs):
+        upstream.DEADLINE.set(self.deadline_at)
+        return fn(*args, **kwargs)
+
+    def results(self):
+        wait([future for future, _, _ in self._parts.values()], timeout=self.remaining())
+        results = {}
+        for name, (future, required, default) in self._parts.items():
+            if not future.done():
+                future.cancel()
+                if required:
+                    _count("deadline_exceeded")
+                    raise GatewayTimeout(f"{name} did not respond in time")
+                _count("degraded")
+                results[name] = default
+            elif future.exception() is not None:
+                if required:
+                    _count("failed")
+                    raise future.exception()
+                _count("degraded")
+                results[name] = default
+            else:
+                results[name] = future.result()
+        return results
@@ -0,0 +1,121 @@
+"""In-process verification of auth-service access tokens.
+
+The auth service publishes its public signing keys at
+``/.well-known/jwks.json`` (RS256/EdDSA deployments). Verifying a token here
+is then a signature check against a cached key set, not a ``/me`` round
+trip. Copied verbatim into blog-api and frontend (like compression.py);
+keep the copies identical.
+
+The key set is refetched after ``ttl`` seconds, or early when a token names
+an unknown ``kid`` (a rotation), but never more often than
+``min_refresh_interval`` so forged kids cannot turn into a fetch per
+request. If the auth service is unreachable the last good key set keeps
+being used.
+"""
+import json
+import threading
+import time
+import urllib.request
+
+import jwt
+
+DEFAULT_ALGORITHMS = ("RS256", "EdDSA")
+
+
+class KeySetUnavailable(Exception):
+    """No key set could be fetched and none is cached."""
+
+
+def bearer_token(header_value):
+    """Return the token from an ``Authorization: Bearer ...`` value, or None."""
+    if not header_value or not header_value.startswith("Bearer "):
+        return None
+    return header_value.split(" ", 1)[1].strip() or None
+
+
+def fetch_json(url, timeout):
+    with urllib.request.urlopen(url, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+class TokenVerifier:
+    def __init__(
+        self,
+        jwks_url,
+        algorithms=DEFAULT_ALGORITHMS,
+        ttl=300.0,
+        min_refresh_interval=30.0,
+        timeout=2.0,
+        fetch=fetch_json,
+        clock=time.monotonic,
+    ):
+        self.jwks_url = jwks_url
+        self.algorithms = tuple(algorithms)
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.fetch = fetch
+        self.clock = clock
+        self._keys = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    def _refresh(self, force):
+        with self._lock:
+            now = self.clock()
+            if self._fetched_at is not None:
+                age = now - self._fetched_at
+                if age < self.min_refresh_interval or (not force and age < self.ttl):
+                    return
+            try:
+                jwks = self.fetch(self.jwks_url, self.timeout)
+                keys = {}
+                for jwk in jwks.get("keys", []):
+                    if jwk.get("use", "sig") == "sig" and jwk.get("alg") in self.algorithms and "kid" in jwk:
+                        keys[jwk["kid"]] = (jwt.PyJWK(jwk).key, jwk["alg"])
+            except Exception:
+                self.fetch_errors += 1
+                # Back off as if the fetch succeeded; keep the old keys.
+                self._fetched_at = now
+                if self._keys is None:
+                    raise KeySetUnavailable(self.jwks_url)
+                return
+            self.fetches += 1
+            self._keys = keys
+            self._fetched_at = now
+
+    def signing_key(self, kid):
+        self._refresh(force=False)
+        if self._keys is None:
+            raise KeySetUnavailable(self.jwks_url)
+        key = self._keys.get(kid)
+        if key is None:
+            self._refresh(force=True)
+            key = self._keys.get(kid)
+        return key
+
+    def verify(self, token):
+        """Return the token's verified claims.
+
+        Raises jwt.InvalidTokenError for bad, expired or unknown-key tokens,
+        and KeySetUnavailable if no keys have ever been fetched.
+        """
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") not in self.algorithms:
+            raise jwt.InvalidAlgorithmError(f"Algorithm {header.get('alg')!r} is not accepted")
+        entry = self.signing_key(header.get("kid"))
+        if entry is None:
+            raise jwt.InvalidTokenError(f"Unknown key id {header.get('kid')!r}")
+        key, algorithm = entry
+        # The key's own algorithm, not the header's, decides how to verify.
+        return jwt.decode(token, key, algorithms=[algorithm])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": sorted(self._keys or ()),
+                "fetches": self.fetches,
+                "fetch_errors": self.fetch_errors,
+            }
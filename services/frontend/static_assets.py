@@ -0,0 +1,152 @@
+"""Fingerprinted, precompressed static files with far-future caching.
+
+Flask serves ``static/`` with revalidation, so every page view re-requested
+the same stylesheet just to get a 304. ``flask build-assets`` (run by the
+Dockerfile) copies each static file to ``build/static`` under a name that
+includes a hash of its content, e.g. ``css/style.3f2a9c01d4e5.css``. It adds
+a ``.gz`` variant where gzip makes the file smaller and writes a manifest
+that maps logical names to hashed ones.
+
+Templates link files with ``asset_url('css/style.css')``, which takes the
+same arguments as ``url_for('static', filename=...)``. With a current build
+it returns the hashed name. The static view serves hashed names from the
+build, gzipped if the client accepts it, as ``Cache-Control: public,
+max-age=31536000, immutable``. A changed file gets a new URL, so browsers
+never need to revalidate. Files that are not in the build (a dev checkout,
+or a source edited since the build) are served as before.
+
+The frontend image is built from its own directory, so this module is copied
+verbatim into services/frontend; keep the copies identical.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+import click
+from flask import current_app, request, send_file, url_for
+from flask.cli import with_appcontext
+
+MANIFEST = "manifest.json"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_MIMETYPES = frozenset({"application/javascript", "application/json", "image/svg+xml"})
+
+
+def default_path(app):
+    return os.getenv("STATIC_BUILD") or os.path.join(app.root_path, "build", "static")
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def static_files(app):
+    """Yield every file under the app's static folder as a '/'-separated relative name."""
+    for dirpath, _, filenames in os.walk(app.static_folder):
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, app.static_folder).replace(os.sep, "/")
+
+
+def is_compressible(filename):
+    mimetype = mimetypes.guess_type(filename)[0]
+    return bool(mimetype) and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES)
+
+
+def build(app, path):
+    """Write hashed copies (and .gz variants) of the static files to ``path``; returns the manifest."""
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    assets = {}
+    for name in static_files(app):
+        source = os.path.join(app.static_folder, name)
+        digest = file_digest(source)
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{digest[:12]}{ext}"
+        target = os.path.join(path, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(source, target)
+        gzipped = False
+        if is_compressible(name):
+            with open(source, "rb") as f:
+                data = f.read()
+            packed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(packed) < len(data):
+                with open(target + ".gz", "wb") as f:
+                    f.write(packed)
+                gzipped = True
+        assets[name] = {"path": hashed, "sha256": digest, "gzip": gzipped}
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump({"assets": assets}, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return assets
+
+
+def load(app, path):
+    """Return the build's entries whose source still matches, keyed by logical name."""
+    try:
+        with open(os.path.join(path, MANIFEST), "r") as f:
+            assets = json.load(f)["assets"]
+    except FileNotFoundError:
+        return {}
+    current = {}
+    for name, entry in assets.items():
+        source = os.path.join(app.static_folder, name)
+        if os.path.exists(source) and file_digest(source) == entry["sha256"]:
+            current[name] = entry
+        else:
+            app.logger.warning("Static build in %s is out of date for %s; serving it unhashed", path, name)
+    return current
+
+
+class StaticAssets:
+    def __init__(self, app=None):
+        self.assets = {}
+        self.by_path = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("STATIC_BUILD", default_path(app))
+        self.path = app.config["STATIC_BUILD"]
+        self.assets = load(app, self.path)
+        self.by_path = {entry["path"]: entry for entry in self.assets.values()}
+        self.send_static_file = app.send_static_file
+        app.extensions["static_assets"] = self
+        app.view_functions["static"] = self.serve
+        app.add_template_global(self.asset_url, "asset_url")
+        app.cli.add_command(build_assets_command)
+
+    def asset_url(self, filename, **values):
+        """``url_for('static', filename=...)``, pointing at the hashed copy when there is one."""
+        entry = self.assets.get(filename)
+        return url_for("static", filename=entry["path"] if entry else filename, **values)
+
+    def serve(self, filename):
+        entry = self.by_path.get(filename)
+        if entry is None:
+            return self.send_static_file(filename)
+        path = os.path.join(self.path, filename)
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        gzipped = entry["gzip"] and request.accept_encodings["gzip"] > 0
+        resp = send_file(path + ".gz" if gzipped else path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+        if gzipped:
+            resp.headers["Content-Encoding"] = "gzip"
+        if entry["gzip"]:
+            resp.vary.add("Accept-Encoding")
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
+
+
+@click.command("build-assets")
+@click.option("--output", default=None, help="directory to write (default: STATIC_BUILD)")
+@with_appcontext
+def build_assets_command(output):
+    """Write content-hashed, precompressed copies of the static files."""
+    path = output or current_app.config["STATIC_BUILD"]
+    assets = build(current_app, path)
+    click.echo(f"Built {len(assets)} static files ({sum(e['gzip'] for e in assets.values())} gzipped) to {path}")
@@ -0,0 +1,135 @@
+"""A stale-while-revalidate cache with single-flight loading.
+
+Page views used to fetch from the blog-api every time, so a popular post
+cost one upstream request per visitor. Responses are now cached for ``ttl``
+seconds. After that, for up to ``stale_ttl`` more, the stale value is served
+while one background refresh runs. Concurrent misses for the same key share
+a single upstream fetch. Upstream load therefore tracks the number of
+distinct resources, not the traffic.
+
+``invalidate()`` drops entries and bumps a generation. Fetches that started
+before it can neither populate the cache nor be joined by later callers. A
+page that follows the frontend's own write therefore always sees that write.
+
+``peek()`` returns whatever is cached, even past ``stale_ttl``, so a loader
+can revalidate its previous value instead of fetching it again.
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class SWRCache:
+    def __init__(self, ttl=2.0, stale_ttl=30.0, max_entries=1024, refresh_workers=4, clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="swr-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.errors = 0
+
+    def get(self, key, loader):
+        """Return the cached value for ``key``, calling ``loader()`` at most once per flight."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.stale_until:
+                self._entries.move_to_end(key)
+                if now < entry.fresh_until:
+                    self.hits += 1
+                    return entry.value
+                self.stale_hits += 1
+                future, started = self._flight(key)
+                if started:
+                    self._refresher.submit(self._load, key, loader, future, self._generation)
+                return entry.value
+            self.misses += 1
+            future, started = self._flight(key)
+            generation = self._generation
+            if not started:
+                self.coalesced += 1
+        if started:
+            self._load(key, loader, future, generation)
+        return future.result()
+
+    def peek(self, key):
+        """Return the value cached for ``key`` however old it is, or None; counts as no lookup."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.value if entry is not None else None
+
+    def _flight(self, key):
+        # Called with the lock held. Flights are per generation, so nobody
+        # joins a fetch that an invalidation has already made obsolete.
+        flight_key = (key, self._generation)
+        future = self._inflight.get(flight_key)
+        if future is not None:
+            return future, False
+        future = Future()
+        self._inflight[flight_key] = future
+        return future, True
+
+    def _load(self, key, loader, future, generation):
+        try:
+            value = loader()
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop((key, generation), None)
+                self.errors += 1
+            # A failed background refresh keeps serving the stale value.
+            future.set_exception(exc)
+            return
+        now = self.clock()
+        with self._lock:
+            self._inflight.pop((key, generation), None)
+            self.loads += 1
+            if generation == self._generation and self.max_entries > 0:
+                self._entries[key] = _Entry(value, now + self.ttl, now + self.ttl + self.stale_ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+
+    def invalidate(self, predicate=None):
+        """Drop entries whose key satisfies ``predicate`` (all entries if None)."""
+        with self._lock:
+            self._generation += 1
+            if predicate is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if predicate(k)]:
+                    del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "entries": len(self._entries),
+                "inflight": len(self._inflight),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "loads": self.loads,
+                "errors": self.errors,
+            }
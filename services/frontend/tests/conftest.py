@@ -0,0 +1,97 @@
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(autouse=True)
+def service_modules():
+    """Make this service's top-level modules the importable ones.
+
+    The monolith and each service have modules with the same names (``app``,
+    ``compression``, ``template_cache``, ...). A ``pytest`` run from the repo
+    root imports them all into one interpreter, so forget whichever copies
+    another suite loaded and put this service first on ``sys.path``.
+    """
+    for path in SERVICE_ROOT.glob("*.py"):
+        sys.modules.pop(path.stem, None)
+    sys.path.insert(0, str(SERVICE_ROOT))
+    yield
+    sys.path.remove(str(SERVICE_ROOT))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def handle_request(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        server = self.server
+        with server.lock:
+            server.requests.append(
+                {"method": self.command, "path": self.path, "headers": dict(self.headers), "port": self.client_address[1]}
+            )
+        status, headers, payload, delay = server.responder(self.command, self.path, body)
+        if delay:
+            time.sleep(delay)
+        payload = payload.encode("utf-8") if isinstance(payload, str) else payload
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_request
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Tests time out and disconnect on purpose; only report real errors.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+@pytest.fixture
+def stub_server():
+    """A local HTTP/1.1 server standing in for an upstream.
+
+    Set ``server.responder = fn(method, path, body) -> (status, headers, body, delay)``;
+    every request received is recorded in ``server.requests``.
+    """
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.responder = lambda method, path, body: (200, {"Content-Type": "application/json"}, "{}", 0)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/"
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def frontend(stub_server, monkeypatch):
+    """Import the frontend app with blog-api and auth pointed at ``stub_server``."""
+    monkeypatch.setenv("BLOG_API_BASE", stub_server.url)
+    monkeypatch.setenv("AUTH_API_BASE", stub_server.url)
+    monkeypatch.setenv("BLOG_API_RETRIES", "0")
+    monkeypatch.setenv("PRECOMPILED_TEMPLATES", str(SERVICE_ROOT / "no-build"))
+    monkeypatch.setenv("STATIC_BUILD", str(SERVICE_ROOT / "no-build"))
+    import app as frontend_app
+
+    frontend_app.app.config.update(TESTING=True)
+    return frontend_app
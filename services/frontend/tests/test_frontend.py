@@ -0,0 +1,626 @@
+import pytest
+import requests
+
+
+def json_response(status=200, body="{}", delay=0, headers=None):
+    return lambda method, path, payload: (status, dict({"Content-Type": "application/json"}, **(headers or {})), body, delay)
+
+
+def received(server, method):
+    return [r for r in server.requests if r["method"] == method]
+
+
+def test_upstream_reuses_one_connection(stub_server):
+    from upstream import Upstream
+
+    api = Upstream("blog-api", stub_server.url, retries=0)
+    for _ in range(5):
+        assert api.get("/posts").status_code == 200
+    assert len({r["port"] for r in stub_server.requests}) == 1
+    stats = api.stats()
+    assert stats["requests"] == 5
+    assert stats["connections_opened"] == 1
+    assert stats["connections_reused"] == 4
+
+
+def test_upstream_does_not_keep_cookies(stub_server):
+    from upstream import Upstream
+
+    stub_server.responder = json_response(headers={"Set-Cookie": "session=alice"})
+    api = Upstream("auth", stub_server.url, retries=0)
+    api.get("/login")
+    api.get("/me")
+    assert "Cookie" not in stub_server.requests[-1]["headers"]
+
+
+def test_upstream_retries_reads_only_for_idempotent_methods(stub_server):
+    from upstream import Upstream
+
+    stub_server.responder = json_response(delay=0.3)
+    api = Upstream("blog-api", stub_server.url, retries=2, backoff=0, read_timeout=0.05)
+    with pytest.raises(requests.RequestException):
+        api.post("/posts", json={"title": "t"})
+    assert len(received(stub_server, "POST")) == 1
+    with pytest.raises(requests.RequestException):
+        api.get("/posts")
+    assert len(received(stub_server, "GET")) == 3
+
+
+def test_upstream_retries_5xx_only_for_idempotent_methods(stub_server):
+    from upstream import Upstream
+
+    stub_server.responder = json_response(503)
+    api = Upstream("blog-api", stub_server.url, retries=2, backoff=0)
+    assert api.post("/posts", json={"title": "t"}).status_code == 503
+    assert len(received(stub_server, "POST")) == 1
+    assert api.put("/posts/1", json={"title": "t"}).status_code == 503
+    assert len(received(stub_server, "PUT")) == 3
+
+
+def test_upstream_retries_refused_connections_for_every_method():
+    import socket
+
+    from upstream import Upstream
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    api = Upstream("blog-api", f"http://127.0.0.1:{port}/", retries=2, backoff=0)
+    with pytest.raises(requests.ConnectionError):
+        api.post("/posts", json={"title": "t"})
+    assert api.stats()["retries"] == 2
+
+
+@pytest.fixture
+def deadline():
+    """Set the request deadline ``seconds`` from now, as the app does per request."""
+    import time
+
+    import upstream
+
+    tokens = []
+
+    def set_deadline(seconds):
+        tokens.append(upstream.DEADLINE.set(time.monotonic() + seconds))
+
+    yield set_deadline
+    for token in reversed(tokens):
+        upstream.DEADLINE.reset(token)
+
+
+def test_upstream_recomputes_the_budget_for_each_attempt(stub_server, deadline):
+    from upstream import DEADLINE_HEADER, Upstream
+
+    stub_server.responder = json_response(503, delay=0.05)
+    api = Upstream("blog-api", stub_server.url, retries=2, backoff=0.05)
+    deadline(2.0)
+    assert api.get("/posts").status_code == 503
+    budgets = [int(r["headers"][DEADLINE_HEADER]) for r in stub_server.requests]
+    assert len(budgets) == 3
+    assert budgets[0] <= 2000
+    assert budgets[0] > budgets[1] > budgets[2]
+
+
+def test_upstream_deadline_is_not_a_breaker_failure(stub_server, deadline):
+    import time
+
+    from upstream import DeadlineExceeded, Upstream
+
+    stub_server.responder = json_response(delay=0.5)
+    api = Upstream("blog-api", stub_server.url, retries=2, backoff=0)
+    deadline(0.2)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        api.get("/posts")
+    assert time.monotonic() - started < 0.4
+    assert len(stub_server.requests) == 1
+    assert api.breaker.stats()["window_requests"] == 0
+
+
+def test_upstream_skips_a_retry_that_would_outlast_the_deadline(stub_server, deadline):
+    from upstream import Upstream
+
+    stub_server.responder = json_response(503)
+    api = Upstream("blog-api", stub_server.url, retries=2, backoff=1.0)
+    deadline(0.5)
+    assert api.get("/posts").status_code == 503
+    assert len(stub_server.requests) == 1
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def wait_until(condition, timeout=2.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_swr_serves_stale_while_one_refresh_runs():
+    import threading
+
+    from swr_cache import SWRCache
+
+    clock = FakeClock()
+    cache = SWRCache(ttl=2, stale_ttl=30, clock=clock)
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(len(calls))
+        if len(calls) > 1:
+            release.wait(2)
+        return len(calls)
+
+    assert cache.get("k", loader) == 1
+    clock.advance(1)
+    assert cache.get("k", loader) == 1  # fresh: no load
+    clock.advance(2)
+    assert cache.get("k", loader) == 1  # stale: served, refresh started
+    assert cache.get("k", loader) == 1  # the same refresh is still running
+    release.set()
+    wait_until(lambda: cache.stats()["loads"] == 2)
+    assert cache.get("k", loader) == 2
+    assert len(calls) == 2
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"]) == (2, 2, 1)
+
+    clock.advance(2 + 30)
+    assert cache.get("k", loader) == 3  # past stale_ttl: loaded in the foreground
+
+
+def test_swr_failed_refresh_keeps_the_stale_value():
+    from swr_cache import SWRCache
+
+    clock = FakeClock()
+    cache = SWRCache(ttl=2, stale_ttl=30, clock=clock)
+    cache.get("k", lambda: "old")
+    clock.advance(3)
+
+    def failing():
+        raise RuntimeError("blog-api down")
+
+    assert cache.get("k", failing) == "old"
+    wait_until(lambda: cache.stats()["errors"] == 1)
+    assert cache.get("k", lambda: "new") == "old"
+    wait_until(lambda: cache.stats()["loads"] == 2)
+    assert cache.get("k", lambda: "newer") == "new"
+
+
+def test_swr_coalesces_concurrent_misses():
+    import threading
+
+    from swr_cache import SWRCache
+
+    cache = SWRCache(clock=FakeClock())
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(2)
+        return "post"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("k", loader))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: cache.stats()["misses"] == 5)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    assert results == ["post"] * 5
+    assert len(calls) == 1
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_swr_invalidation_outdates_running_loads():
+    import threading
+
+    from swr_cache import SWRCache
+
+    cache = SWRCache(clock=FakeClock())
+    release = threading.Event()
+    before = []
+    thread = threading.Thread(target=lambda: before.append(cache.get(("posts", 1), lambda: release.wait(2) and "before")))
+    thread.start()
+    wait_until(lambda: cache.stats()["inflight"] == 1)
+
+    cache.invalidate(lambda key: key[0] == "posts")
+    # A caller after the write does not join the fetch that started before it.
+    assert cache.get(("posts", 1), lambda: "after") == "after"
+    release.set()
+    thread.join(2)
+    assert before == ["before"]
+    # Nor does that fetch overwrite what was loaded since.
+    assert cache.get(("posts", 1), lambda: "reloaded") == "after"
+
+
+def test_swr_invalidate_drops_only_matching_keys():
+    from swr_cache import SWRCache
+
+    cache = SWRCache(clock=FakeClock())
+    cache.get(("posts", 20, None), lambda: "index")
+    cache.get(("post", 1), lambda: "one")
+    cache.get(("post", 2), lambda: "two")
+    cache.invalidate(lambda key: key[0] == "posts" or key == ("post", 1))
+    assert cache.get(("posts", 20, None), lambda: "index v2") == "index v2"
+    assert cache.get(("post", 1), lambda: "one v2") == "one v2"
+    assert cache.get(("post", 2), lambda: "two v2") == "two"
+
+
+def test_page_runs_calls_concurrently_in_the_request_context(frontend):
+    import threading
+    import time
+
+    from flask import g, request
+
+    import compose
+
+    barrier = threading.Barrier(2, timeout=1)
+
+    def part(label):
+        barrier.wait()  # only returns once both calls are running
+        return f"{label}:{request.args['q']}:{g.user_id}"
+
+    with frontend.app.test_request_context("/?q=hello"):
+        g.user_id = 7
+        started = time.monotonic()
+        results = compose.Page(2).add("a", part, "a").add("b", part, label="b").results()
+    assert results == {"a": "a:hello:7", "b": "b:hello:7"}
+    assert time.monotonic() - started < 1
+
+
+def test_page_required_and_optional_failures(frontend):
+    from werkzeug.exceptions import NotFound, abort
+
+    import compose
+
+    def missing():
+        abort(404)
+
+    def broken():
+        raise RuntimeError("auth down")
+
+    with frontend.app.test_request_context("/"):
+        results = compose.Page(1).add("post", lambda: "post").add("user", broken, required=False, default="anon").results()
+        assert results == {"post": "post", "user": "anon"}
+        with pytest.raises(NotFound):
+            compose.Page(1).add("post", missing).add("user", lambda: "alice", required=False).results()
+
+
+def test_page_deadline(frontend):
+    import threading
+    import time
+
+    from werkzeug.exceptions import GatewayTimeout
+
+    import compose
+
+    release = threading.Event()
+    slow = lambda: release.wait(2) and "late"  # noqa: E731
+    try:
+        with frontend.app.test_request_context("/"):
+            started = time.monotonic()
+            results = compose.Page(0.1).add("post", lambda: "post").add("related", slow, required=False).results()
+            assert results == {"post": "post", "related": None}
+            with pytest.raises(GatewayTimeout):
+                compose.Page(0.1).add("post", slow).results()
+            assert time.monotonic() - started < 0.5
+    finally:
+        release.set()
+
+
+def test_post_page_is_a_504_when_blog_api_misses_the_deadline(frontend, stub_server):
+    stub_server.responder = json_response(body='{"id": 1, "title": "Slow", "content": "", "created": ""}', delay=0.5)
+    frontend.app.config["PAGE_DEADLINE"] = 0.2
+    res = frontend.app.test_client().get("/1")
+    assert res.status_code == 504
+    assert len(stub_server.requests) == 1
+    assert 0 < int(stub_server.requests[0]["headers"]["X-Request-Deadline-Ms"]) <= 200
+
+
+def test_post_page_renders_and_404s(frontend, stub_server):
+    def responder(method, path, body):
+        if path == "/posts/1":
+            return 200, {"Content-Type": "application/json"}, '{"id": 1, "title": "First", "content": "Hi", "created": ""}', 0
+        return 404, {"Content-Type": "application/json"}, '{"error": "Post not found"}', 0
+
+    stub_server.responder = responder
+    client = frontend.app.test_client()
+    res = client.get("/1")
+    assert res.status_code == 200
+    assert b"First" in res.data
+    assert client.get("/2").status_code == 404
+
+
+def test_breaker_opens_then_probes():
+    from breaker import CircuitBreaker, CircuitOpen
+
+    clock = FakeClock()
+    breaker = CircuitBreaker("blog-api", threshold=0.5, min_requests=4, window=10, cooldown=5, clock=clock)
+    for ok in (True, False, True):
+        assert breaker.before_call() is False
+        breaker.record(ok)
+    assert breaker.state == "closed"  # below min_requests
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    clock.advance(2)
+    with pytest.raises(CircuitOpen) as raised:
+        breaker.before_call()
+    assert raised.value.retry_after == 3
+    breaker.record(True)  # a call that went out before it opened
+    assert breaker.state == "open"
+
+    clock.advance(3)
+    assert breaker.before_call() is True  # the half-open probe
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()  # only one probe at a time
+    breaker.record(False, probe=True)
+    assert breaker.state == "open"
+
+    clock.advance(5)
+    assert breaker.before_call() is True
+    breaker.record(True, probe=True)
+    assert breaker.state == "closed"
+    assert breaker.before_call() is False
+    assert breaker.stats() == {"state": "closed", "window_requests": 0, "window_failures": 0, "opened": 2, "rejected": 2}
+
+
+def test_breaker_forgets_outcomes_outside_its_window():
+    from breaker import CircuitBreaker
+
+    clock = FakeClock()
+    breaker = CircuitBreaker("blog-api", threshold=0.5, min_requests=4, window=10, cooldown=5, clock=clock)
+    for _ in range(3):
+        breaker.record(False)
+    clock.advance(11)
+    breaker.record(False)
+    assert breaker.state == "closed"
+    assert breaker.stats()["window_failures"] == 1
+
+
+def test_breaker_releases_an_abandoned_probe():
+    from breaker import CircuitBreaker
+
+    clock = FakeClock()
+    breaker = CircuitBreaker("blog-api", min_requests=1, cooldown=5, clock=clock)
+    breaker.record(False)
+    clock.advance(5)
+    assert breaker.before_call() is True
+    breaker.cancel(True)
+    assert breaker.before_call() is True
+
+
+def test_upstream_fails_fast_while_its_breaker_is_open(stub_server):
+    from breaker import CircuitBreaker, CircuitOpen
+    from upstream import Upstream
+
+    stub_server.responder = json_response(500)
+    api = Upstream("blog-api", stub_server.url, retries=0, breaker=CircuitBreaker("blog-api", min_requests=2))
+    assert api.get("/posts").status_code == 500
+    assert api.get("/posts").status_code == 500
+    with pytest.raises(CircuitOpen):
+        api.get("/posts")
+    assert len(stub_server.requests) == 2
+
+
+def hedged_upstream(url, latency=0.05):
+    from upstream import HEDGE_MIN_SAMPLES, Upstream
+
+    api = Upstream("blog-api", url, retries=0, hedge=True)
+    api._latencies.extend([latency] * HEDGE_MIN_SAMPLES)
+    return api
+
+
+def test_hedge_answers_from_the_faster_attempt(stub_server):
+    import time
+
+    stub_server.responder = lambda method, path, body: (
+        200, {"Content-Type": "application/json"}, f'{{"attempt": {len(stub_server.requests)}}}', 1 if len(stub_server.requests) == 1 else 0
+    )
+    api = hedged_upstream(stub_server.url)
+    assert api.hedge_delay() == 0.05
+    started = time.monotonic()
+    assert api.get("/posts/1").json() == {"attempt": 2}
+    assert time.monotonic() - started < 0.5
+    stats = api.stats()["hedging"]
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_hedge_is_not_sent_when_the_first_attempt_is_quick(stub_server):
+    api = hedged_upstream(stub_server.url, latency=0.5)
+    assert api.get("/posts/1").status_code == 200
+    assert len(stub_server.requests) == 1
+    assert api.stats()["hedging"]["hedged"] == 0
+
+
+def test_hedge_prefers_an_answer_over_a_failure(stub_server):
+    # The first attempt times out after the hedge has already answered.
+    stub_server.responder = lambda method, path, body: (
+        200, {"Content-Type": "application/json"}, "{}", 1 if len(stub_server.requests) == 1 else 0.1
+    )
+    api = hedged_upstream(stub_server.url)
+    assert api.get("/posts/1", timeout=(1, 0.2)).status_code == 200
+    assert api.stats()["hedging"]["hedge_wins"] == 1
+
+
+def test_hedge_is_skipped_when_it_would_outlast_the_deadline(stub_server, deadline):
+    from upstream import DeadlineExceeded
+
+    stub_server.responder = json_response(delay=0.3)
+    api = hedged_upstream(stub_server.url, latency=0.2)
+    deadline(0.15)
+    with pytest.raises(DeadlineExceeded):
+        api.get("/posts/1")
+    assert len(stub_server.requests) == 1
+    assert api.stats()["hedging"]["hedged"] == 0
+
+
+def test_buffered_joins_template_output_into_utf8_chunks(frontend):
+    chunks = list(frontend.buffered(["ab", "cd", "é", "fgh", "i"], 4))
+    assert chunks == ["abcd".encode(), "éfgh".encode(), b"i"]
+    assert list(frontend.buffered([], 4)) == []
+
+
+def ndjson_posts(count):
+    import json
+
+    body = "".join(json.dumps({"id": i, "title": f"Post {i}", "created": "2024-01-01"}) + "\n" for i in range(count, 0, -1))
+    return lambda method, path, payload: (200, {"Content-Type": "application/x-ndjson"}, body, 0)
+
+
+@pytest.fixture
+def streaming(frontend, stub_server, monkeypatch):
+    """The frontend with INDEX_STREAM on; ``streaming.opened`` collects the upstream responses."""
+    frontend.app.config.update(INDEX_STREAM=True, INDEX_STREAM_BUFFER=1024)
+    frontend.opened = []
+    open_post_stream = frontend.open_post_stream
+
+    def recording(cursor):
+        resp = open_post_stream(cursor)
+        frontend.opened.append(resp)
+        return resp
+
+    monkeypatch.setattr(frontend, "open_post_stream", recording)
+    return frontend
+
+
+def test_streamed_index_renders_every_post(streaming, stub_server):
+    stub_server.responder = ndjson_posts(200)
+    res = streaming.app.test_client().get("/?cursor=abc", buffered=False)
+    chunks = list(res.response)
+    res.close()
+    html = b"".join(chunks).decode()
+    assert res.status_code == 200
+    assert html.count("<h2>Post ") == 200
+    assert html.index("Post 200") < html.index("Post 1<")
+    assert all(len(chunk) >= 1024 for chunk in chunks[:-1])
+    assert len(chunks) > 1
+    request = stub_server.requests[0]
+    assert request["path"].startswith("/posts?")
+    assert "stream=1" in request["path"] and "cursor=abc" in request["path"]
+    assert streaming.opened[0].raw.closed
+
+
+def test_streamed_index_closes_upstream_on_client_disconnect(streaming, stub_server):
+    stub_server.responder = ndjson_posts(20000)
+    res = streaming.app.test_client().get("/", buffered=False)
+    first = next(iter(res.response))
+    assert b"Welcome to FlaskBlog" in first
+    upstream_resp = streaming.opened[0]
+    assert not upstream_resp.raw.closed
+    res.close()  # the client went away
+    assert upstream_resp.raw.closed
+
+
+def test_streamed_index_errors_before_the_body_starts(streaming, stub_server):
+    stub_server.responder = json_response(400, body='{"error": "Invalid cursor"}')
+    assert streaming.app.test_client().get("/?cursor=bad").status_code == 400
+    stub_server.responder = json_response(503)
+    res = streaming.app.test_client().get("/")
+    assert res.status_code == 503
+    assert res.headers["Retry-After"] == "1"
+
+
+def test_expired_cache_entries_are_revalidated_with_their_etag(frontend, stub_server):
+    def responder(method, path, body):
+        request = stub_server.requests[-1]
+        if request["headers"].get("If-None-Match") == 'W/"p1-v1"':
+            return 304, {"ETag": 'W/"p1-v1"'}, "", 0
+        return 200, {"Content-Type": "application/json", "ETag": 'W/"p1-v1"'}, '{"id": 1, "title": "First", "content": "", "created": ""}', 0
+
+    stub_server.responder = responder
+    clock = FakeClock()
+    frontend.api_cache.clock = clock
+    client = frontend.app.test_client()
+    assert b"First" in client.get("/1").data
+    assert "If-None-Match" not in stub_server.requests[0]["headers"]
+
+    clock.advance(frontend.api_cache.ttl + frontend.api_cache.stale_ttl)
+    res = client.get("/1")
+    assert res.status_code == 200
+    assert b"First" in res.data
+    assert stub_server.requests[1]["headers"]["If-None-Match"] == 'W/"p1-v1"'
+
+    # after the frontend's own write the cached copy is not trusted
+    frontend.posts_changed(1)
+    client.get("/1")
+    assert "If-None-Match" not in stub_server.requests[2]["headers"]
+
+
+def blog_api_routes(routes):
+    """A responder answering ``(method, path)`` from ``routes`` with ``(status, json body)``."""
+
+    def responder(method, path, body):
+        status, payload = routes.get((method, path), (404, '{"error": "Post not found"}'))
+        return status, {"Content-Type": "application/json"}, payload, 0
+
+    return responder
+
+
+POST_1 = '{"id": 1, "title": "First", "content": "Hi", "created": ""}'
+
+
+def test_create_posts_and_drops_cached_listings(frontend, stub_server):
+    stub_server.responder = blog_api_routes({("POST", "/posts"): (201, POST_1)})
+    frontend.api_cache.get(("posts", 20, None), lambda: (None, 200, [], None))
+    client = frontend.app.test_client()
+    res = client.post("/create", data={"title": "First", "content": "Hi"}, headers={"Authorization": "Bearer t"})
+    assert res.status_code == 302
+    assert stub_server.requests[0]["headers"]["Authorization"] == "Bearer t"
+    assert frontend.api_cache.peek(("posts", 20, None)) is None
+
+    assert b"Title is required!" in client.post("/create", data={"title": " "}).data
+    assert len(stub_server.requests) == 1
+
+
+def test_edit_is_applied_without_fetching_the_post(frontend, stub_server):
+    # GET /posts/1 fails; the update alone decides the outcome
+    stub_server.responder = blog_api_routes({("PUT", "/posts/1"): (200, POST_1), ("GET", "/posts/1"): (500, "{}")})
+    frontend.api_cache.get(("post", 1), lambda: ('W/"p1-v0"', {"id": 1, "title": "Old"}))
+    res = frontend.app.test_client().post("/1/edit", data={"title": "First", "content": "Hi"})
+    assert res.status_code == 302
+    assert [(r["method"], r["path"]) for r in stub_server.requests] == [("PUT", "/posts/1")]
+    assert frontend.api_cache.peek(("post", 1)) is None
+
+
+def test_edit_rerenders_the_form_when_the_update_fails(frontend, stub_server):
+    stub_server.responder = blog_api_routes(
+        {("PUT", "/posts/1"): (401, '{"error": "Authentication required"}'), ("GET", "/posts/1"): (200, POST_1)}
+    )
+    client = frontend.app.test_client()
+    res = client.post("/1/edit", data={"title": "First", "content": "Hi"})
+    assert res.status_code == 200
+    assert b"Error updating post: Authentication required" in res.data
+    assert b"First" in res.data
+
+    res = client.post("/1/edit", data={"title": ""})
+    assert b"Title is required!" in res.data
+    assert [r["method"] for r in stub_server.requests] == ["PUT", "GET"]  # the post was cached
+
+
+def test_delete_reports_the_title_blog_api_returns(frontend, stub_server):
+    stub_server.responder = blog_api_routes({("DELETE", "/posts/1"): (200, '{"id": 1, "title": "Deleted title"}')})
+    frontend.api_cache.get(("post", 1), lambda: (None, {"id": 1, "title": "Cached title"}))
+    client = frontend.app.test_client()
+    res = client.post("/1/delete")
+    assert res.status_code == 302
+    assert [(r["method"], r["path"]) for r in stub_server.requests] == [("DELETE", "/posts/1")]
+    assert frontend.api_cache.peek(("post", 1)) is None
+    with client.session_transaction() as session:
+        assert session["_flashes"] == [("message", '"Deleted title" was successfully deleted!')]
+
+    assert client.post("/2/delete").status_code == 404
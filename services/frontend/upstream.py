@@ -0,0 +1,312 @@
+"""Pooled, keep-alive HTTP clients for the frontend's upstream services.
+
+The module-level ``requests.get()`` helpers build a throwaway Session per
+call, so every blog-api request paid for a new TCP connection. Each upstream
+now gets one long-lived ``requests.Session`` whose ``HTTPAdapter`` keeps up
+to ``pool_size`` connections alive per host. Failed calls are retried with
+exponential backoff. Reads and 502/503/504 responses are only retried for
+idempotent methods; connection failures are retried for every method, since
+the request never reached the server.
+
+Every call is bounded by the request's deadline (``DEADLINE``, set per
+request by the app). Each attempt's timeouts are cut to the time that is
+left, and the remaining budget is sent downstream in
+``X-Request-Deadline-Ms`` so the upstream can give up on work nobody is
+waiting for. Retries happen here rather than in urllib3, which would resend
+the first attempt's timeout and header. A retry whose backoff would outlast
+the deadline is not made, and an attempt cut off by the deadline raises
+``DeadlineExceeded``, which does not count against the breaker. Each upstream sits
+behind a ``CircuitBreaker``. GETs can optionally be hedged: if the first
+attempt has not answered within the upstream's recent p95 latency, a second
+one is sent and whichever answers first is used.
+
+Settings come from ``<PREFIX>_POOL_SIZE``, ``<PREFIX>_RETRIES``,
+``<PREFIX>_BACKOFF``, ``<PREFIX>_CONNECT_TIMEOUT``,
+``<PREFIX>_READ_TIMEOUT``, ``<PREFIX>_HEDGE`` (``1`` to enable),
+``<PREFIX>_BREAKER_THRESHOLD``, ``<PREFIX>_BREAKER_MIN_REQUESTS``,
+``<PREFIX>_BREAKER_WINDOW`` and ``<PREFIX>_BREAKER_COOLDOWN`` (e.g.
+``BLOG_API_POOL_SIZE``).
+"""
+import contextvars
+import http.cookiejar
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from breaker import CircuitBreaker
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = (502, 503, 504)
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+# Hedging waits until this many latencies have been seen to estimate a p95.
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 512
+
+# The ``time.monotonic()`` by which the current request must be answered.
+DEADLINE = contextvars.ContextVar("upstream_deadline", default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Raised when the request's deadline passes before an upstream has answered."""
+
+
+def never_sent(exc):
+    """True if ``exc`` means the request did not reach the upstream, so any method may be retried."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    # Refused connections arrive as a ConnectionError wrapping urllib3's MaxRetryError.
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    """An HTTPAdapter that counts in-flight requests."""
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.errors = 0
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            resp = super().send(request, *args, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        return resp
+
+    def pool_stats(self):
+        opened = idle = 0
+        for key in list(self.poolmanager.pools.keys()):
+            pool = self.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        with self._lock:
+            return {
+                "pool_size": self._pool_maxsize,
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "connections_opened": opened,
+                "connections_idle": idle,
+                "connections_reused": max(0, self.requests - opened),
+                "errors": self.errors,
+            }
+
+
+class Upstream:
+    """A shared, thread-safe client for one upstream base URL."""
+
+    def __init__(
+        self,
+        name,
+        base_url,
+        pool_size=32,
+        retries=2,
+        backoff=0.1,
+        connect_timeout=2.0,
+        read_timeout=5.0,
+        hedge=False,
+        breaker=None,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge = hedge
+        self.breaker = breaker or CircuitBreaker(name)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._lock = threading.Lock()
+        self._hedger = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f"{name}-hedge") if hedge else None
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.retried = 0
+        self.adapter = InstrumentedAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        # Upstream cookies must not leak between the users sharing this session.
+        self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    @classmethod
+    def from_env(cls, name, prefix, base_url):
+        def setting(key, default, cast=float):
+            return cast(os.getenv(f"{prefix}_{key}", default))
+
+        return cls(
+            name,
+            base_url,
+            pool_size=setting("POOL_SIZE", "32", int),
+            retries=setting("RETRIES", "2", int),
+            backoff=setting("BACKOFF", "0.1"),
+            connect_timeout=setting("CONNECT_TIMEOUT", "2"),
+            read_timeout=setting("READ_TIMEOUT", "5"),
+            hedge=setting("HEDGE", "0", int) == 1,
+            breaker=CircuitBreaker(
+                name,
+                threshold=setting("BREAKER_THRESHOLD", "0.5"),
+                min_requests=setting("BREAKER_MIN_REQUESTS", "20", int),
+                window=setting("BREAKER_WINDOW", "10"),
+                cooldown=setting("BREAKER_COOLDOWN", "5"),
+            ),
+        )
+
+    def url(self, path):
+        return urljoin(self.base_url, path.lstrip("/"))
+
+    def request(self, method, path, **kwargs):
+        deadline = DEADLINE.get()
+        probe = self.breaker.before_call()
+        started = time.monotonic()
+        try:
+            resp = self._send(method, path, kwargs, deadline)
+        except DeadlineExceeded:
+            self.breaker.cancel(probe)
+            raise
+        except Exception:
+            self.breaker.record(False, probe)
+            raise
+        self.breaker.record(resp.status_code < 500, probe)
+        if resp.status_code < 500:
+            with self._lock:
+                self._latencies.append(time.monotonic() - started)
+        return resp
+
+    def _send(self, method, path, kwargs, deadline):
+        """Make the call, retrying failures while the retry budget and the deadline allow."""
+        idempotent = method in IDEMPOTENT_METHODS
+        for attempt in itertools.count():
+            attempt_kwargs = self._within_deadline(kwargs, deadline)
+            try:
+                if self.hedge and method == "GET":
+                    resp = self._hedged(path, attempt_kwargs, deadline)
+                else:
+                    resp = self.session.request(method, self.url(path), **attempt_kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise DeadlineExceeded(f"{self.name} did not answer in time") from exc
+                if not ((idempotent or never_sent(exc)) and self._may_retry(attempt, deadline)):
+                    raise
+            else:
+                if not (resp.status_code in RETRY_STATUSES and idempotent and self._may_retry(attempt, deadline)):
+                    return resp
+                resp.close()
+            time.sleep(self._backoff(attempt))
+            with self._lock:
+                self.retried += 1
+
+    def _within_deadline(self, kwargs, deadline):
+        """``kwargs`` for one attempt, with the timeout and deadline header cut to the time left."""
+        kwargs = dict(kwargs)
+        kwargs.setdefault("timeout", self.timeout)
+        if deadline is None:
+            return kwargs
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"no time left to call {self.name}")
+        connect, read = kwargs["timeout"] if isinstance(kwargs["timeout"], tuple) else (kwargs["timeout"],) * 2
+        kwargs["timeout"] = (min(connect, remaining), min(read, remaining))
+        kwargs["headers"] = dict(kwargs.get("headers") or {}, **{DEADLINE_HEADER: str(int(remaining * 1000))})
+        return kwargs
+
+    def _backoff(self, attempt):
+        return self.backoff * 2**attempt
+
+    def _may_retry(self, attempt, deadline):
+        if attempt >= self.retries:
+            return False
+        return deadline is None or time.monotonic() + self._backoff(attempt) < deadline
+
+    def hedge_delay(self):
+        """This upstream's recent p95 latency, or None until enough calls have been seen."""
+        with self._lock:
+            if len(self._latencies) < HEDGE_MIN_SAMPLES:
+                return None
+            return percentile(self._latencies, 95)
+
+    def _hedged(self, path, kwargs, deadline):
+        delay = self.hedge_delay()
+        if delay is None or (deadline is not None and time.monotonic() + delay >= deadline):
+            return self.session.request("GET", self.url(path), **kwargs)
+        first = self._hedger.submit(self.session.request, "GET", self.url(path), **kwargs)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+        second = self._hedger.submit(self.session.request, "GET", self.url(path), **kwargs)
+        with self._lock:
+            self.hedged += 1
+        pending = {first, second}
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            answered = [future for future in done if future.exception() is None]
+            if answered or not pending:
+                # A failure only counts once both attempts have failed.
+                winner = answered[0] if answered else first
+                for loser in {first, second} - {winner}:
+                    loser.add_done_callback(_close_response)
+                if winner is second:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return winner.result()
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def stats(self):
+        delay = self.hedge_delay()
+        with self._lock:
+            hedging = {
+                "enabled": self.hedge,
+                "delay_ms": round(delay * 1000, 3) if delay is not None else None,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+            }
+            retried = self.retried
+        return dict(
+            self.adapter.pool_stats(),
+            retries=retried,
+            base_url=self.base_url,
+            hedging=hedging,
+            breaker=self.breaker.stats(),
+        )
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
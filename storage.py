@@ -0,0 +1,106 @@
+import zlib
+
+# Bodies at least this many UTF-8 bytes long are stored zlib-compressed.
+DEFAULT_COMPRESS_THRESHOLD = 512
+
+
+def pack_body(content, threshold=DEFAULT_COMPRESS_THRESHOLD):
+    """Return ``(compressed, body)`` for storing ``content`` in post_bodies.
+
+    Short bodies stay as plain TEXT; longer ones are compressed when that
+    actually saves space.
+    """
+    raw = content.encode('utf-8')
+    if len(raw) >= threshold:
+        packed = zlib.compress(raw, 6)
+        if len(packed) < len(raw):
+            return 1, packed
+    return 0, content
+
+
+def unpack_body(compressed, body):
+    if body is None:
+        return ''
+    if compressed:
+        return zlib.decompress(body).decode('utf-8')
+    return body
+
+
+def load_post(conn, post_id):
+    """Return post ``post_id`` with its decompressed content, or None."""
+    row = conn.execute('SELECT posts.id, posts.created, posts.title,'
+                       ' post_bodies.compressed, post_bodies.body'
+                       ' FROM posts LEFT JOIN post_bodies ON post_bodies.post_id = posts.id'
+                       ' WHERE posts.id = ?', (post_id,)).fetchone()
+    if row is None:
+        return None
+    return {
+        'id': row['id'],
+        'created': row['created'],
+        'title': row['title'],
+        'content': unpack_body(row['compressed'], row['body']),
+    }
+
+
+def insert_post(conn, title, content, threshold=DEFAULT_COMPRESS_THRESHOLD):
+    """Insert a post, its body and its search entry; return the new id.
+
+    The caller owns the transaction.
+    """
+    post_id = conn.execute('INSERT INTO posts (title) VALUES (?)', (title,)).lastrowid
+    conn.execute('INSERT INTO post_bodies (post_id, compressed, body) VALUES (?, ?, ?)',
+                 (post_id, *pack_body(content, threshold)))
+    conn.execute('INSERT INTO posts_fts (rowid, title, content) VALUES (?, ?, ?)',
+                 (post_id, title, content))
+    return post_id
+
+
+def begin_write(conn):
+    """Start a write transaction now rather than at the first write.
+
+    Updates and deletes read the row they unindex; taking the write lock
+    first means no other writer can change it in between.
+    """
+    if not conn.in_transaction:
+        conn.execute('BEGIN IMMEDIATE')
+
+
+def update_post(conn, post_id, title, content, threshold=DEFAULT_COMPRESS_THRESHOLD):
+    """Rewrite post ``post_id`` with a new title and body; return the old post, or None.
+
+    The caller owns the transaction, which this starts with begin_write().
+    """
+    begin_write(conn)
+    post = load_post(conn, post_id)
+    if post is None:
+        return None
+    conn.execute('UPDATE posts SET title = ? WHERE id = ?', (title, post_id))
+    conn.execute('INSERT OR REPLACE INTO post_bodies (post_id, compressed, body) VALUES (?, ?, ?)',
+                 (post_id, *pack_body(content, threshold)))
+    unindex_post(conn, post)
+    conn.execute('INSERT INTO posts_fts (rowid, title, content) VALUES (?, ?, ?)',
+                 (post_id, title, content))
+    return post
+
+
+def delete_post(conn, post_id):
+    """Delete post ``post_id``; return the deleted post, or None.
+
+    The caller owns the transaction, which this starts with begin_write().
+    """
+    begin_write(conn)
+    post = load_post(conn, post_id)
+    if post is None:
+        return None
+    conn.execute('DELETE FROM post_bodies WHERE post_id = ?', (post_id,))
+    conn.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+    unindex_post(conn, post)
+    return post
+
+
+def unindex_post(conn, post):
+    # posts_fts is contentless, so removing an entry means restating the
+    # exact text that was indexed, read in the same write transaction.
+    conn.execute("INSERT INTO posts_fts (posts_fts, rowid, title, content)"
+                 " VALUES ('delete', ?, ?, ?)",
+                 (post['id'], post['title'], post['content']))
@@ -0,0 +1,98 @@
+"""Jinja templates compiled at build time instead of in every worker.
+
+Flask parses and compiles a template the first time each worker renders it,
+so every cold start paid for template compilation on its first requests.
+``flask precompile-templates`` (run by the Dockerfile) compiles every
+template to a Python module, byte-compiles those, and writes a manifest of
+the sources they came from to ``build/templates``. ``init_app`` then loads
+templates through Jinja's ``ModuleLoader``, so no template source is parsed.
+It imports them all at startup, so the first request renders like any
+other.
+
+The manifest guards against drift. If a source no longer matches it (a
+template edited after the build, or a stale build in a dev checkout), or
+Jinja's version differs, the build is ignored and templates load from source
+as before. Auto-reload is off while precompiled templates are in use.
+
+The frontend image is built from its own directory, so this module is copied
+verbatim into services/frontend; keep the copies identical.
+"""
+import compileall
+import glob
+import hashlib
+import json
+import os
+
+import click
+import jinja2
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import ChoiceLoader, ModuleLoader
+
+MANIFEST = "manifest.json"
+
+
+def default_path(app):
+    return os.getenv("PRECOMPILED_TEMPLATES") or os.path.join(app.root_path, "build", "templates")
+
+
+def source_hashes(app):
+    """Return ``{template name: sha256 of its source}`` read through the app's own loader."""
+    env = app.jinja_env
+    loader = app.create_global_jinja_loader()
+    hashes = {}
+    for name in loader.list_templates():
+        source, _, _ = loader.get_source(env, name)
+        hashes[name] = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    return hashes
+
+
+def build(app, path):
+    """Compile every template of ``app`` into ``path``; returns the template names."""
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "tmpl_*.py")):
+        os.remove(stale)
+    hashes = source_hashes(app)
+    env = app.jinja_env.overlay(loader=app.create_global_jinja_loader())
+    env.compile_templates(path, zip=None, filter_func=lambda name: name in hashes, ignore_errors=False)
+    # The images set PYTHONDONTWRITEBYTECODE, so ship the bytecode too.
+    compileall.compile_dir(path, quiet=1)
+    with open(os.path.join(path, MANIFEST), "w") as f:
+        json.dump({"jinja": jinja2.__version__, "templates": hashes}, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return sorted(hashes)
+
+
+def load(app, path):
+    """Serve templates from the build in ``path`` if it matches the sources; returns True if so."""
+    try:
+        with open(os.path.join(path, MANIFEST), "r") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return False
+    if manifest["jinja"] != jinja2.__version__ or manifest["templates"] != source_hashes(app):
+        app.logger.warning("Precompiled templates in %s are out of date; compiling from source", path)
+        return False
+    # Anything missing from the build (nothing, normally) still loads from source.
+    app.jinja_env.loader = ChoiceLoader([ModuleLoader(path), app.jinja_env.loader])
+    app.config["TEMPLATES_AUTO_RELOAD"] = False
+    app.jinja_env.auto_reload = False
+    for name in manifest["templates"]:
+        app.jinja_env.get_template(name)
+    return True
+
+
+def init_app(app):
+    app.config.setdefault("PRECOMPILED_TEMPLATES", default_path(app))
+    app.cli.add_command(precompile_templates_command)
+    app.extensions["template_cache"] = load(app, app.config["PRECOMPILED_TEMPLATES"])
+
+
+@click.command("precompile-templates")
+@click.option("--output", default=None, help="directory to write (default: PRECOMPILED_TEMPLATES)")
+@with_appcontext
+def precompile_templates_command(output):
+    """Compile the app's Jinja templates ahead of time."""
+    path = output or current_app.config["PRECOMPILED_TEMPLATES"]
+    names = build(current_app, path)
+    click.echo(f"Compiled {len(names)} templates to {path}")
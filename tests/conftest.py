@@ -23,26 +23,24 @@ def client(tmp_path):
 
     tmp_db = tmp_path / 'database.db'
 
+    # Ensure project root is on sys.path so `import app` works regardless of CWD
+    sys.path.insert(0, str(project_root))
+    # The services have their own app/db/... modules; when pytest runs them in
+    # the same interpreter, drop their copies so the monolith's are imported.
+    for path in project_root.glob('*.py'):
+        sys.modules.pop(path.stem, None)
+    import storage
+
     # Create and initialize the temporary database
     conn = sqlite3.connect(str(tmp_db))
     with open(project_root / 'schema.sql', 'r') as f:
         conn.executescript(f.read())
 
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO posts (title, content) VALUES (?, ?)",
-        ('First Post', 'Content for the first post'),
-    )
-    cur.execute(
-        "INSERT INTO posts (title, content) VALUES (?, ?)",
-        ('Second Post', 'Content for the second post'),
-    )
+    storage.insert_post(conn, 'First Post', 'Content for the first post')
+    storage.insert_post(conn, 'Second Post', 'Content for the second post')
     conn.commit()
     conn.close()
 
-    # Ensure project root is on sys.path so `import app` works regardless of CWD
-    sys.path.insert(0, str(project_root))
-
     # Import and reload the app module so we can patch its DB connector
     import app as blog_app
     importlib.reload(blog_app)
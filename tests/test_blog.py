@@ -1,3 +1,8 @@
+from pathlib import Path
+
+import pytest
+
+
 def test_index_shows_posts(client):
     res = client.get('/')
     assert res.status_code == 200
@@ -36,3 +41,175 @@ def test_delete_post(client):
     res = client.post('/2/delete', follow_redirects=True)
     assert res.status_code == 200
     assert b'was successfully deleted' in res.data
+
+
+def test_db_pool_reuses_connections(client):
+    client.get('/')
+    client.get('/1')
+    # edit reads and writes through the same request-scoped connection
+    client.post('/1/edit', data={'title': 'Pooled', 'content': 'x'})
+    stats = client.get('/metrics/db-pool').get_json()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 2
+    assert stats['open'] == 1
+    assert stats['idle'] == 1
+
+
+def test_index_keyset_pagination(client):
+    import re
+
+    res = client.get('/?limit=1')
+    assert b'Second Post' in res.data
+    assert b'First Post' not in res.data
+    older = re.search(rb'href="(/\?before=[^"]+)"', res.data).group(1).replace(b'&amp;', b'&')
+
+    res = client.get(older.decode())
+    assert b'First Post' in res.data
+    assert b'Second Post' not in res.data
+    assert b'before=' not in res.data
+    newer = re.search(rb'href="(/\?after=[^"]+)"', res.data).group(1).replace(b'&amp;', b'&')
+
+    res = client.get(newer.decode())
+    assert b'Second Post' in res.data
+    assert b'First Post' not in res.data
+
+
+def test_index_rejects_bad_cursor(client):
+    assert client.get('/?before=not-a-cursor').status_code == 400
+
+
+def test_page_cache_serves_and_invalidates(client):
+    client.get('/1')
+    client.get('/1')
+    stats = client.get('/metrics/page-cache').get_json()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+    client.post('/1/edit', data={'title': 'Cache Busted', 'content': 'x'})
+    assert b'Cache Busted' in client.get('/1').data
+    assert b'Cache Busted' in client.get('/').data
+
+
+def test_page_cache_keeps_flashes_per_user(client):
+    client.get('/')
+    res = client.post('/2/delete', follow_redirects=True)
+    assert b'was successfully deleted' in res.data
+    # the flash is consumed and must not be baked into the cached page
+    assert b'was successfully deleted' not in client.get('/').data
+
+
+def test_search_posts(client):
+    client.post('/create', data={'title': 'Gardening notes', 'content': 'Tomatoes'})
+    client.post('/create', data={'title': 'Cooking', 'content': 'Herbs from gardening'})
+
+    res = client.get('/search?q=gardening')
+    assert res.status_code == 200
+    assert res.data.index(b'Gardening notes') < res.data.index(b'Cooking')
+
+    client.post('/1/edit', data={'title': 'First Post', 'content': 'gardening too'})
+    assert b'First Post' in client.get('/search?q=gardening').data
+    assert b'No posts match' in client.get('/search?q=zzz').data
+    assert client.get('/search?q="unbalanced').status_code == 200
+    # NUL would end FTS5's string literal mid-query
+    assert b'No posts match' in client.get('/search?q=%00').data
+    assert b'Gardening notes' in client.get('/search?q=garden%00ing').data
+
+
+def test_edit_unindexes_the_text_it_replaces(client, tmp_path):
+    import sqlite3
+
+    import storage
+
+    # worker A has shown the edit form; worker B saves an edit meanwhile
+    worker_a = sqlite3.connect(str(tmp_path / 'database.db'))
+    worker_a.row_factory = sqlite3.Row
+    storage.load_post(worker_a, 1)
+    worker_b = sqlite3.connect(str(tmp_path / 'database.db'))
+    worker_b.row_factory = sqlite3.Row
+    storage.update_post(worker_b, 1, 'beta', 'beta')
+    worker_b.commit()
+    worker_b.close()
+
+    storage.update_post(worker_a, 1, 'gamma', 'gamma')
+    worker_a.commit()
+    worker_a.close()
+    assert b'No posts match' in client.get('/search?q=beta').data
+    assert b'gamma' in client.get('/search?q=gamma').data
+
+    assert client.post('/99/edit', data={'title': 'x', 'content': 'y'}).status_code == 404
+    assert client.post('/99/delete').status_code == 404
+
+
+def test_long_bodies_are_stored_compressed(client):
+    body = 'A fairly long post body that repeats itself. ' * 100
+    client.post('/create', data={'title': 'Long', 'content': body})
+    res = client.get('/3')
+    assert body.encode() in res.data
+
+    import app as blog_app
+    with blog_app.app.app_context():
+        row = blog_app.db.get_db().execute(
+            'SELECT compressed, length(body) FROM post_bodies WHERE post_id = 3').fetchone()
+    assert row[0] == 1
+    assert row[1] < len(body)
+
+
+def test_precompiled_templates_render_like_source(client, tmp_path):
+    import app as blog_app
+    import template_cache
+
+    app = blog_app.app
+    source_html = client.get('/').data
+    assert template_cache.build(app, str(tmp_path / 'templates')) == [
+        'base.html', 'create.html', 'edit.html', 'index.html', 'post.html', 'search.html']
+    assert template_cache.load(app, str(tmp_path / 'templates'))
+    assert not app.jinja_env.auto_reload
+    app.jinja_env.cache.clear()
+    blog_app.page_cache.clear()
+    assert client.get('/').data == source_html
+    assert client.get('/1').status_code == 200
+
+    # a build that no longer matches its sources is ignored
+    manifest = tmp_path / 'templates' / template_cache.MANIFEST
+    manifest.write_text(manifest.read_text().replace('"base.html": "', '"base.html": "0'))
+    assert not template_cache.load(app, str(tmp_path / 'templates'))
+
+
+def test_static_assets_are_fingerprinted_and_immutable(client, tmp_path):
+    import app as blog_app
+    import static_assets
+
+    app = blog_app.app
+    assets = static_assets.build(app, str(tmp_path / 'static'))
+    hashed = assets['css/style.css']['path']
+    assert hashed.startswith('css/style.') and hashed != 'css/style.css'
+    app.config['STATIC_BUILD'] = str(tmp_path / 'static')
+    app.extensions['static_assets'].init_app(app)
+
+    page = client.get('/').data.decode()
+    assert '/static/' + hashed in page
+    res = client.get('/static/' + hashed)
+    assert res.status_code == 200
+    assert res.mimetype == 'text/css'
+    assert res.cache_control.immutable and res.cache_control.max_age == 31536000
+    # unhashed names are still served, without the far-future lifetime
+    res = client.get('/static/css/style.css')
+    assert res.status_code == 200 and not res.cache_control.immutable
+
+
+# Each service image is built from its own directory, so these modules are
+# copied into every service that uses them.
+SHARED_MODULES = {
+    'compression.py': ['services/auth', 'services/blog-api', 'services/frontend'],
+    'jwt_verifier.py': ['services/blog-api', 'services/frontend'],
+    'migrate.py': ['services/auth', 'services/blog-api'],
+    'template_cache.py': ['.', 'services/frontend'],
+    'static_assets.py': ['.', 'services/frontend'],
+}
+
+
+@pytest.mark.parametrize('module', sorted(SHARED_MODULES))
+def test_shared_module_copies_are_identical(module):
+    root = Path(__file__).resolve().parent.parent
+    copies = {directory: (root / directory / module).read_bytes() for directory in SHARED_MODULES[module]}
+    assert len(set(copies.values())) == 1, f'{module} differs between {", ".join(copies)}'